@@ -1,25 +1,76 @@
-import math
 import json
+import math
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import quote
 from typing import List , Dict
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response, PlainTextResponse
 from pydantic import BaseModel
 from app.utils.logger import setup_logger
-from app.utils.decoder import decode_subtitle_bytes
-from app.utils.parser import parse_srt_content
-from app.utils.timeline import normalize_subtitle_timeline
-from app.utils.cleaner import prepare_for_translation
-from app.services.fireworks import translate_chunk
-from app.utils.storage import save_fireworks_translation_data
-import re
+from app.utils.config import env_int
+from app.services.fireworks import translate_chunk, MODEL_NAME, PROMPT_VERSION
+from app.services.pipeline import run_translation_pipeline, run_batch_pipeline, make_clean_title
+from app.services.result_cache import result_cache
+from app.utils.preprocess import decoded_fingerprint
+from app.utils.sentences import SENTENCE_MERGE
+from app.utils.archive import read_srt_archive, build_zip
+from app.services.jobs import job_manager, JobQueueFullError
+from app.services.cpu_pool import cpu_pool
+from app.services.retry import CircuitOpenError
+from app.services.providers import provider_router
+from app.services.http_transport import llm_http
+from app.utils.translation_memory import translation_memory
+from app.utils.storage import translation_store
+from app.utils.checkpoint import evict_checkpoints
+from app.utils import metrics
 import os
 
 logger = setup_logger("srt-app")
-MAX_FILE_SIZE = 5 * 1024 * 1024
-
-app = FastAPI(title="SRT Translator", version="1.4.0")
-
-BASE_STORAGE = os.path.join(os.getcwd(), "storage")
-SRT_OUTPUT_DIR = os.path.join(BASE_STORAGE, "srt")
+# cueها فشرده نگه داشته می‌شوند، پس فایل‌های بزرگ (سریال‌های چندساعته) هم جا می‌شوند
+MAX_FILE_SIZE = env_int("MAX_FILE_SIZE_MB", 50) * 1024 * 1024
+MAX_BATCH_SIZE = 100 * 1024 * 1024
+
+
+def _collect_runtime_gauges() -> None:
+    for provider in provider_router.providers:
+        dispatcher = provider.dispatcher.stats()
+        metrics.DISPATCHER_LIMIT.labels(provider=provider.name).set(dispatcher["limit"])
+        metrics.DISPATCHER_ACTIVE.labels(provider=provider.name).set(dispatcher["active"])
+        metrics.DISPATCHER_WAITING.labels(provider=provider.name).set(dispatcher["waiting"])
+        metrics.CIRCUIT_OPEN.labels(provider=provider.name).set(1 if provider.breaker.is_open() else 0)
+    metrics.JOB_QUEUE_DEPTH.set(job_manager.queue_depth())
+    pool = cpu_pool.stats()
+    metrics.CPU_POOL_ACTIVE.set(pool["active"])
+    metrics.CPU_POOL_WAITING.set(pool["waiting"])
+    metrics.RESULT_CACHE_ENTRIES.set(result_cache.stats()["entries"])
+    http_pool = llm_http.stats()
+    metrics.LLM_HTTP_CONNECTIONS.labels(state="open").set(http_pool["open_connections"])
+    metrics.LLM_HTTP_CONNECTIONS.labels(state="idle").set(http_pool["idle_connections"])
+    metrics.LLM_HTTP_ACTIVE.set(http_pool["active_requests"])
+    metrics.LLM_HTTP_SATURATION.set(http_pool["saturation"])
+
+
+metrics.REGISTRY.add_collector(_collect_runtime_gauges)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    cpu_pool.start()
+    llm_http.start()
+    # SDK provider در پس‌زمینه load می‌شود؛ سرویس منتظرش نمی‌ماند
+    preload = asyncio.create_task(provider_router.preload_sdks())
+    await asyncio.to_thread(translation_store.evict)
+    await asyncio.to_thread(evict_checkpoints)
+    await job_manager.start()
+    yield
+    preload.cancel()
+    await job_manager.stop()
+    await llm_http.aclose()
+    cpu_pool.shutdown()
+
+
+app = FastAPI(title="SRT Translator", version="1.4.0", lifespan=lifespan)
 
 
 class TranslationPreview(BaseModel):
@@ -49,138 +100,278 @@ class TestRequest(BaseModel):
     data: List[Dict] # لیست آبجکت‌ها شامل index و original
 
 
-def estimate_json_tokens(obj: any) -> int:
-    """
-    Estimates tokens for the entire JSON structure.
-    Gemini uses about 1 token per 4 characters for English/JSON.
-    """
-    json_string = json.dumps(obj)
-    # Average: 4 chars per token + safety margin
-    return math.ceil(len(json_string) / 3.8)
+def _attachment_header(filename: str) -> str:
+    # هدرها latin-1 هستند؛ نام فارسی با RFC 5987 و یک نام ASCII برای کلاینت‌های قدیمی، مثل FileResponse
+    fallback = "".join(c if c.isascii() and c not in '"\\' else "_" for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _reject_if_provider_down() -> None:
+    # تا وقتی مدار باز است آپلود جدید پذیرفته نمی‌شود (load shedding)
+    if provider_router.is_unavailable():
+        raise HTTPException(
+            status_code=503,
+            detail="Translation provider is unavailable, retry later.",
+            headers={"Retry-After": str(math.ceil(provider_router.retry_in()))}
+        )
 
 
 @app.post("/translate")
 async def translate_srt(
         file: UploadFile = File(...),
-        chunk_size: int = Query(30, ge=10, le=200),
+        chunk_size: int = Query(100, ge=10, le=500, description="Upper bound on cues per chunk"),
         genre: str = Query("General"),
-        extra_context: str = Query(None)
+        extra_context: str = Query(None),
+        mode: str = Query("sync", pattern="^(sync|job|download)$",
+                          description="sync: JSON result, job: 202 + job id, download: the translated .srt itself"),
+        trace: bool = Query(False, description="sync mode: include per-stage and per-LLM-call spans in the response"),
+        merge_sentences: bool = Query(None, description="Translate multi-cue sentences as one item (default: SENTENCE_MERGE)")
 ):
     if not file.filename.lower().endswith(".srt"):
         raise HTTPException(status_code=415, detail="Only .srt files are allowed.")
+    _reject_if_provider_down()
 
     content = await file.read()
     if len(content) > MAX_FILE_SIZE:
         raise HTTPException(status_code=413, detail="File too large")
 
-    extracted_title = os.path.splitext(file.filename)[0]
-
+    params = {
+        "chunk_size": chunk_size,
+        "genre": genre,
+        "extra_context": extra_context,
+        # مقدار قطعی در کلید کش می‌رود، نه None
+        "merge_sentences": SENTENCE_MERGE if merge_sentences is None else merge_sentences
+    }
+
+    # حالت job: شناسه فوراً برمی‌گردد و ترجمه در پس‌زمینه انجام می‌شود
+    if mode == "job":
+        try:
+            job = job_manager.submit(file.filename, content, params)
+        except JobQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+        return JSONResponse(status_code=202, content={
+            "status": "queued",
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "download_url": f"/jobs/{job.id}/download"
+        })
+
+    trace_token = metrics.start_trace() if trace else None
     try:
-        # آماده‌سازی اولیه
-        decoded_text = decode_subtitle_bytes(content)
-        parsed_blocks = parse_srt_content(decoded_text)
-        normalized_blocks = normalize_subtitle_timeline(parsed_blocks)
-        final_blocks = prepare_for_translation(normalized_blocks)
-
-        all_translated_items = []
-        total_chunks = (len(final_blocks) + chunk_size - 1) // chunk_size
-
-        # پاکسازی نام فیلم برای استفاده در مسیرها
-        clean_title = re.sub(r'[^\w\-]', '', extracted_title.lower().replace(" ", "-"))
-
-        # حلقه ترجمه
-        for i in range(0, len(final_blocks), chunk_size):
-            batch = final_blocks[i: i + chunk_size]
-            current_chunk_data = [{"index": b["index"], "original": b["text"]} for b in batch]
-
-            # ارسال به سرویس Fireworks
-            translated_batch = await translate_chunk(
-                chunk_data=current_chunk_data,
-                title=clean_title,
-                genre=genre,
-                extra_context=extra_context
+        # آپلودهای یکسان (همان متن و پارامترها) یک اجرای مشترک دارند و نتیجه‌شان کش می‌شود
+        _, clean_title = make_clean_title(file.filename)
+        key, decoded_text = await cpu_pool.run(decoded_fingerprint, content, {
+            **params, "title": clean_title, "model": MODEL_NAME, "prompt_version": PROMPT_VERSION
+        })
+        # متن decode‌شده کلید به pipeline می‌رود تا فایل دو بار decode نشود
+        result, cache_status = await result_cache.get_or_run(
+            key, lambda: run_translation_pipeline(
+                content=content, filename=file.filename, decoded_text=decoded_text, **params
             )
-            all_translated_items.extend(translated_batch)
-            logger.info(f"[{extracted_title}] Processed chunk {i // chunk_size + 1}/{total_chunks}")
+        )
+        result = {**result, "cache": cache_status}
+        if mode == "download":
+            # فایل اتمیک نوشته شده، پس مستقیم و تکه‌تکه از دیسک استریم می‌شود
+            file_info = result["file_info"]
+            return FileResponse(file_info["path"], media_type="application/x-subrip", filename=file_info["filename"])
+        if trace_token:
+            result = {**result, "trace": metrics.finish_trace(trace_token)}
+            trace_token = None
+        return result
+
+    except CircuitOpenError as e:
+        logger.warning(f"Pipeline aborted for {file.filename}: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_in))})
 
-        # ذخیره دیتای خام Fireworks (بک‌آپ)
-        foreworks_data = {
-            "status": "success",
-            "metadata": {"title": clean_title, "genre": genre},
-            "translated_data": all_translated_items
-        }
-        # استفاده از clean_title برای نام فایل JSON
-        save_fireworks_translation_data(f"{clean_title}.json", foreworks_data)
-
-        # نقشه نگاشت ایندکس به متن ترجمه شده
-        # نقشه نگاشت ایندکس به متن ترجمه شده
-        trans_map = {str(item["index"]): item["translated"] for item in all_translated_items}
-        # RLM = "\u200f"
-        # بازسازی رشته SRT
-        # تنظیم متن امضا
-        signature_text = "{\\an8}Localized by AI Architecture"
-
-        srt_final_string = ""
-        current_idx = 1  # شمارنده هوشمند برای مدیریت ترتیب ایندکس‌ها
-
-        # ۱. اضافه کردن امضا به ابتدای فیلم (ثانیه ۱ تا ۵)
-        srt_final_string += f"{current_idx}\n00:00:01,000 --> 00:00:05,000\n{signature_text}\n\n"
-        current_idx += 1
-
-        # ۲. ساخت بدنه اصلی زیرنویس
-        for block in normalized_blocks:
-            idx_str = str(block["index"])
-            translated_text = trans_map.get(idx_str, "").strip()
-
-            # حذف کاراکترهای کنترلی برای جلوگیری از نمایش "مربع" در پلیرهای قدیمی
-            translated_text = translated_text.replace('\u200f', '').replace('\u200e', '')
-
-            # منطق انتخاب متن
-            if translated_text:
-                final_text = translated_text
-            elif "[" in block["text"] or "]" in block["text"] or "♪" in block["text"]:
-                final_text = ""
-            else:
-                final_text = block["text"]
+    except Exception as e:
+        file_name = file.filename if file else "Unknown File"
+        logger.error(f"Pipeline Failure for {file_name}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-            # ساخت بلاک SRT با ایندکس جدید
-            # اگر نمی‌خواهی خطوط خالی در فایل باشند، شرط if final_text: را بگذار
-            srt_final_string += f"{current_idx}\n"
-            srt_final_string += f"{block['start']} --> {block['end']}\n"
-            srt_final_string += f"{final_text}\n\n"
+    finally:
+        if trace_token:
+            metrics.finish_trace(trace_token)
 
-            current_idx += 1
 
-        # ۳. اضافه کردن امضا به انتهای فیلم
-        if normalized_blocks:
-            # گرفتن زمان پایان آخرین دیالوگ برای شروع امضای آخر
-            last_end_time = normalized_blocks[-1]['end']
-            # نمایش امضا برای ۵ ثانیه بعد از آخرین دیالوگ (تخمینی)
-            srt_final_string += f"{current_idx}\n{last_end_time} --> 99:00:00.000\n{signature_text}\n\n"
+@app.post("/translate/stream")
+async def translate_srt_stream(
+        file: UploadFile = File(...),
+        chunk_size: int = Query(100, ge=10, le=500, description="Upper bound on cues per chunk"),
+        genre: str = Query("General"),
+        extra_context: str = Query(None),
+        merge_sentences: bool = Query(None, description="Translate multi-cue sentences as one item (default: SENTENCE_MERGE)")
+):
+    """Server-Sent Events: `cue` for every translated line as it arrives, `progress`, then `done` or `error`."""
+    if not file.filename.lower().endswith(".srt"):
+        raise HTTPException(status_code=415, detail="Only .srt files are allowed.")
+    _reject_if_provider_down()
 
-        # ۴. ایجاد پوشه و ذخیره‌سازی نهایی با فرمت استاندارد BOM
-        movie_folder = os.path.join(SRT_OUTPUT_DIR, clean_title)
-        os.makedirs(movie_folder, exist_ok=True)
+    content = await file.read()
+    if len(content) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
 
-        final_path = os.path.join(movie_folder, f"{clean_title}-persian.srt")
-        with open(final_path, "w", encoding="utf-8-sig") as f:
-            f.write(srt_final_string)
+    events: asyncio.Queue = asyncio.Queue()
 
-        return {
-            "status": "success",
-            "message": "Translation completed and file saved.",
-            "file_info": {
-                "title": clean_title,
-                "path": final_path,
-                "total_lines": len(normalized_blocks)
-            }
-        }
+    def on_progress(stage: str, done: int, total: int) -> None:
+        events.put_nowait(("progress", {"stage": stage, "done_chunks": done, "total_chunks": total}))
+
+    async def run() -> None:
+        try:
+            result = await run_translation_pipeline(
+                content=content,
+                filename=file.filename,
+                chunk_size=chunk_size,
+                genre=genre,
+                extra_context=extra_context,
+                progress=on_progress,
+                on_cue=lambda cue: events.put_nowait(("cue", cue)),
+                merge_sentences=merge_sentences
+            )
+            events.put_nowait(("done", result))
+        except Exception as e:
+            logger.error(f"Stream Pipeline Failure for {file.filename}: {e}", exc_info=True)
+            events.put_nowait(("error", {"detail": str(e)}))
+
+    task = asyncio.create_task(run())
+
+    async def event_stream():
+        try:
+            while True:
+                event, data = await events.get()
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                if event in ("done", "error"):
+                    break
+        finally:
+            # کلاینت قطع شده؛ ادامه ترجمه فقط سهمیه را هدر می‌دهد (چک‌پوینت حفظ می‌شود)
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/translate/batch")
+async def translate_srt_batch(
+        files: List[UploadFile] = File(..., description="Episode .srt files and/or .zip archives"),
+        chunk_size: int = Query(100, ge=10, le=500, description="Upper bound on cues per chunk"),
+        genre: str = Query("General"),
+        extra_context: str = Query(None),
+        title: str = Query(None, description="Series title; defaults to the common filename prefix"),
+        merge_sentences: bool = Query(None, description="Translate multi-cue sentences as one item (default: SENTENCE_MERGE)")
+):
+    _reject_if_provider_down()
+
+    episodes = []
+    total_size = 0
+    for upload in files:
+        content = await upload.read()
+        name = upload.filename.lower()
+        try:
+            if name.endswith(".zip"):
+                entries = read_srt_archive(content, MAX_BATCH_SIZE - total_size)
+            elif name.endswith(".srt"):
+                entries = [(upload.filename, content)]
+            else:
+                raise HTTPException(status_code=415, detail=f"Unsupported file: {upload.filename}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        for entry_name, entry_content in entries:
+            if len(entry_content) > MAX_FILE_SIZE:
+                raise HTTPException(status_code=413, detail=f"File too large: {entry_name}")
+            total_size += len(entry_content)
+            episodes.append((entry_name, entry_content))
+
+    if total_size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    if not episodes:
+        raise HTTPException(status_code=400, detail="No .srt files found in upload")
+
+    try:
+        summary, outputs = await run_batch_pipeline(
+            episodes, chunk_size, genre, extra_context, title, merge_sentences
+        )
+
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_in))})
 
     except Exception as e:
-        file_name = file.filename if file else "Unknown File"
-        logger.error(f"Pipeline Failure for {file_name}: {e}", exc_info=True)
+        logger.error(f"Batch Pipeline Failure ({len(episodes)} files): {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    outputs.append(("summary.json", json.dumps(summary, ensure_ascii=False).encode("utf-8")))
+    return Response(
+        content=build_zip(outputs),
+        media_type="application/zip",
+        headers={"Content-Disposition": _attachment_header(f"{summary['title']}-persian.zip")}
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/download")
+async def download_job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    # فایل هر job جداست (storage/srt/<title>/<job_id>.srt)؛ فقط پاکسازی storage حذفش می‌کند
+    file_info = job.result["file_info"]
+    if not os.path.exists(file_info["path"]):
+        raise HTTPException(status_code=410, detail="Job output was evicted from storage")
+    return FileResponse(file_info["path"], media_type="application/x-subrip", filename=file_info["filename"])
+
+
+@app.get("/providers")
+async def providers_status():
+    return provider_router.stats()
+
+
+@app.get("/providers/http")
+async def providers_http_pool():
+    return llm_http.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/translations")
+async def list_translations(
+        title: str = Query(None, description="Film title (normalized like output folder names)"),
+        content_hash: str = Query(None, description="sha256 of the uploaded file"),
+        limit: int = Query(20, ge=1, le=200)
+):
+    if title:
+        _, title = make_clean_title(f"{title}.srt")
+    return await asyncio.to_thread(translation_store.find, title, content_hash, limit)
+
+
+@app.get("/translations/{record_id}")
+async def get_translation(record_id: int):
+    record = await asyncio.to_thread(translation_store.get, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Translation not found")
+    return record
+
+
+@app.get("/memory/stats")
+async def memory_stats():
+    return await asyncio.to_thread(translation_memory.stats)
+
 
 @app.post("/test")
 async def test_fireworks_logic(request: TestRequest):
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Callable, Any
+from app.utils.config import env_str, env_int
+from app.utils.logger import setup_logger
+
+logger = setup_logger("cpu-pool")
+
+CPU_POOL_KIND = env_str("CPU_POOL_KIND", "thread")  # thread | process | inline
+CPU_POOL_WORKERS = env_int("CPU_POOL_WORKERS", min(4, os.cpu_count() or 1))
+CPU_MAX_CONCURRENT_JOBS = env_int("CPU_MAX_CONCURRENT_JOBS", CPU_POOL_WORKERS)
+
+
+class CPUWorkerPool:
+    """
+    Runs CPU-bound pipeline stages (decode/parse/clean, SRT rendering) off the event loop.
+    `thread` keeps the loop responsive (the GIL is released every switch interval);
+    `process` isolates heavy uploads completely; `inline` runs on the loop (debugging).
+    At most `max_concurrent` jobs are submitted at once, the rest wait here, not in the executor.
+    """
+
+    def __init__(self, kind: str, workers: int, max_concurrent: int):
+        if kind not in ("thread", "process", "inline"):
+            raise ValueError(f"Invalid CPU_POOL_KIND: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_concurrent = max(1, max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def start(self) -> None:
+        if self._executor is not None or self.kind == "inline":
+            return
+        # semaphore به event loop همین lifespan تعلق دارد؛ بعد از shutdown دوباره ساخته می‌شود
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self.kind == "process":
+            # spawn: فورک کردن پروسه‌ای که thread و اتصال SQLite دارد امن نیست
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="cpu")
+        logger.info(f"Started {self.kind} CPU pool ({self.workers} workers, {self.max_concurrent} concurrent jobs)")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._semaphore = None
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.kind == "inline":
+            return fn(*args, **kwargs)
+
+        self.start()
+        semaphore = self._semaphore
+
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.active -= 1
+            self.completed += 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed
+        }
+
+
+cpu_pool = CPUWorkerPool(CPU_POOL_KIND, CPU_POOL_WORKERS, CPU_MAX_CONCURRENT_JOBS)
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional, Tuple, AsyncIterator
+from app.utils.config import env_int
+from app.utils.logger import setup_logger
+
+logger = setup_logger("chunk-dispatcher")
+
+WINDOW_SECONDS = 60.0
+
+LLM_MAX_RPM = env_int("LLM_MAX_RPM", 10)
+LLM_MAX_TPM = env_int("LLM_MAX_TPM", 0)  # 0 = بدون محدودیت توکن
+LLM_INITIAL_CONCURRENCY = env_int("LLM_INITIAL_CONCURRENCY", 2)
+LLM_MAX_CONCURRENCY = env_int("LLM_MAX_CONCURRENCY", 8)
+
+
+class AdaptiveDispatcher:
+    """
+    Admits LLM calls under a requests/tokens-per-minute budget with an AIMD
+    concurrency limit: +1 slot after a full window of successes, halved on 429.
+    """
+
+    def __init__(
+            self,
+            rpm: int = 0,
+            tpm: int = 0,
+            initial_concurrency: int = 1,
+            max_concurrency: int = 8,
+            min_concurrency: int = 1
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        self.active = 0
+
+        self._requests: Deque[float] = deque()
+        self._tokens: Deque[Tuple[float, int]] = deque()
+        self._token_sum = 0
+        self._success_streak = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        await self._acquire(estimated_tokens)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._wake()
+
+    def record_success(self) -> None:
+        self._success_streak += 1
+        if self._success_streak >= self.limit and self.limit < self.max_concurrency:
+            self.limit += 1
+            self._success_streak = 0
+            logger.info(f"Concurrency raised to {self.limit}")
+            self._wake()
+
+    def record_rate_limit(self) -> None:
+        self._success_streak = 0
+        new_limit = max(self.min_concurrency, self.limit // 2)
+        if new_limit != self.limit:
+            logger.warning(f"Rate limited, concurrency lowered {self.limit} -> {new_limit}")
+            self.limit = new_limit
+
+    def stats(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "requests_in_window": len(self._requests),
+            "tokens_in_window": self._token_sum
+        }
+
+    async def _acquire(self, tokens: int) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            delay: Optional[float] = None
+            if self.active < self.limit:
+                delay = self._budget_delay(tokens, time.monotonic())
+                if delay <= 0:
+                    break
+
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, delay)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        now = time.monotonic()
+        self.active += 1
+        self._requests.append(now)
+        if tokens:
+            self._tokens.append((now, tokens))
+            self._token_sum += tokens
+
+    def _budget_delay(self, tokens: int, now: float) -> float:
+        self._prune(now)
+        delay = 0.0
+
+        if self.rpm and len(self._requests) >= self.rpm:
+            delay = max(delay, self._requests[0] + WINDOW_SECONDS - now)
+
+        # یک چانک بزرگ‌تر از کل بودجه فقط وقتی پنجره خالی است اجازه دارد
+        if self.tpm and self._tokens and self._token_sum + tokens > self.tpm:
+            freed = 0
+            for ts, count in self._tokens:
+                freed += count
+                if self._token_sum - freed + tokens <= self.tpm:
+                    break
+            delay = max(delay, ts + WINDOW_SECONDS - now)
+
+        return delay
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - WINDOW_SECONDS
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._token_sum -= self._tokens.popleft()[1]
+
+    def _wake(self) -> None:
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
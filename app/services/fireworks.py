@@ -1,212 +1,219 @@
-import os
-import json
+import math
+import time
 import asyncio
-import re
-from typing import List, Dict, Any, cast , Iterable , cast
-from openai import AsyncOpenAI
-from groq import AsyncGroq
-from dotenv import load_dotenv
+from typing import List, Dict, Any, Optional, Callable
 from app.utils.logger import setup_logger
-from app.utils.tones import get_genre_prompt
-from groq.types.chat import ChatCompletionMessageParam
-load_dotenv()
+from app.services.providers import provider_router
+from app.services.prompt import film_prompt, LATIN_PATTERN
+from app.services.retry import retry_policy, classify_error, retry_after_seconds, CircuitOpenError
+from app.utils.chunker import estimate_json_tokens, estimate_output_tokens
+from app.utils.json_stream import JSONObjectStream
+from app.utils.metrics import CHUNK_SECONDS, RETRIES, RETRY_SLEEP_SECONDS, REPAIR_ROUNDS, timed, record_span
 logger = setup_logger("Ai-Translation")
 
-
-# client = AsyncGroq(
-#     api_key=os.getenv("GROQ_AI_API_KEY"),
-# )
-
-# مدل پیشنهادی برای Groq (با توجه به تست‌های قبلی)
-# MODEL_NAME = "meta-llama/llama-4-maverick-17b-128e-instruct"
-
-# open ai
-client = AsyncOpenAI(
-    api_key=os.getenv("GITHUB_API_KEY"),
-    base_url="https://models.github.ai/inference",
-)
-MODEL_NAME = "openai/gpt-5-nano"
-
-SYSTEM_PROMPT = (
-    "You are a top-tier Persian subtitle translator for Iranian movie audiences.\n"
-
-    "TRANSLATION APPROACH:\n"
-    "• Translate into natural, authentic, modern spoken Iranian Persian (Tehrani colloquial style – 2020s)\n"
-    "• Turn idioms, slang, metaphors, sarcasm, humor into the most natural Persian equivalents – NEVER translate literally\n"
-    "• Preserve ORIGINAL MEANING and emotional tone exactly\n"
-    "• Keep translations concise - match subtitle timing\n\n"
-
-    "CRITICAL RULES:\n"
-    "1. Output ONLY Persian script (no Latin/Cyrillic letters)\n"
-    "2. Use colloquial Persian forms\n"
-    "3. Preserve irony/sarcasm - don't make it literal\n"
-    "4. Use MODERN vocabulary (2020s Iranian speech)\n"
-    "5. For names/proper nouns: Transliterate to Persian script—never translate meanings\n"
-    "6. Keep character/term consistency across the movie\n"
-    "7. For ambiguous lines: Choose most context-appropriate natural Persian interpretation\n\n"
-
-    "TECHNICAL REQUIREMENTS:\n"
-    "• Return JSON with 'results' array containing 'index' and 'translated'\n"
-    "• Use EXACT same index numbers from input (vital for SRT sync)\n"
-    "• One translation per line - no merging/splitting\n"
-    "• Array order doesn't matter - indexes handle mapping\n\n"
-
-    "Example output format:\n"
-    '{"results": [{"index": "1", "translated": "ترجمه فارسی"}]}'
-)
-
-
-semaphore = asyncio.Semaphore(1)
-
-def safe_extract_json(text: str) -> str:
-    text = text.strip()
-    if text.startswith("```"):
-        text = re.sub(r'^```(?:json)?\s*|```$', '', text, flags=re.MULTILINE).strip()
-
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        return text[start:end + 1]
-    return ""
+# providerها (GitHub Models، Groq، Gemini یا هر سرور سازگار با OpenAI) از LLM_PROVIDERS خوانده می‌شوند.
+# مدل provider اول کلید حافظه ترجمه و چک‌پوینت است.
+MODEL_NAME = provider_router.primary_model
+
+# با هر تغییر معنادار در SYSTEM_PROMPT (app/services/prompt.py) بالا برود تا حافظه ترجمه قدیمی استفاده نشود
+PROMPT_VERSION = "2"
+MAX_OUTPUT_TOKENS = 4096
+
+# دورهای ترمیم برای خطوط گمشده/خالی/لاتین و تعداد خطوط همسایه‌ای که همراهشان می‌رود
+MAX_REPAIR_ROUNDS = 2
+REPAIR_CONTEXT_LINES = 1
+
+
+def _fallback_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    # متن اصلی جایگزین ترجمه شده؛ fallback نباید در حافظه ترجمه ذخیره شود
+    return {"index": item["index"], "translated": item.get("original", "Error"), "fallback": True}
+
+
+async def _stream_translations(
+        messages: List[Dict[str, str]],
+        estimated_tokens: int,
+        on_object: Callable[[Dict[str, Any]], None]
+) -> Optional[str]:
+    """Streams one completion, handing every parsed result object to on_object; returns finish_reason."""
+    parser = JSONObjectStream()
+    finish_reason = None
+
+    # انتخاب provider، بودجه نرخ، circuit breaker و failover در provider_router انجام می‌شود
+    async for content, reason in provider_router.stream_chat(
+            messages, estimated_tokens, max_tokens=MAX_OUTPUT_TOKENS, temperature=0.1
+    ):
+        if content:
+            for obj in parser.feed(content):
+                on_object(obj)
+        if reason:
+            finish_reason = reason
+
+    return finish_reason
+
+
+def _repair_context(chunk_data: List[Dict[str, Any]], broken: set, translation_map: Dict[str, str]) -> List[Dict]:
+    # همسایه‌ها فقط در جای خطوطی که دوباره ارسال نمی‌شوند جا می‌گیرند، تا درخواست ترمیم از بودجه چانک بزرگ‌تر نشود
+    budget = sum(estimate_json_tokens(item) for item in chunk_data if str(item["index"]) not in broken)
+    positions = [i for i, item in enumerate(chunk_data) if str(item["index"]) in broken]
+    neighbours = sorted({
+        j for i in positions
+        for j in range(i - REPAIR_CONTEXT_LINES, i + REPAIR_CONTEXT_LINES + 1)
+        if 0 <= j < len(chunk_data) and str(chunk_data[j]["index"]) not in broken
+    })
+
+    context = []
+    for j in neighbours:
+        item = chunk_data[j]
+        entry = {"index": item["index"], "original": item["original"]}
+        cost = estimate_json_tokens(entry)
+        if str(item["index"]) in translation_map:
+            entry["translated"] = translation_map[str(item["index"])]
+            cost += estimate_output_tokens(entry["translated"])
+        if cost > budget:
+            continue
+        budget -= cost
+        context.append(entry)
+    return context
 
 
 async def translate_chunk(
         chunk_data: List[Dict[str, Any]],
         title: str = "Unknown",
         genre: str = "General",
-        extra_context: str = ""
+        extra_context: str = "",
+        on_item: Optional[Callable[[Any, str], None]] = None
 ) -> List[Dict[str, Any]]:
-    async with semaphore:
-        max_retries = 5
-        retry_delay = 120  # 2 minutes break
-
-        for attempt in range(max_retries + 1):
-            try:
-                # تغییر در نحوه ساخت payload برای حذف خطوط خالی قبل از ارسال به مدل
-                payload = [
-                    {"index": item["index"], "original": item["original"]}
-                    for item in chunk_data
-                    if item["original"].strip()  # فقط خطوطی که متن دارند را بفرست
-                ]
-                genre_tone = get_genre_prompt(genre)
-
-                user_prompt = (
-                    f"Title: {title}\n"
-                    f"Primary Tone: {genre_tone}\n"
-                    f"Genres: {genre}\n"
-                    f"Scene Context: {extra_context if extra_context else 'N/A'}\n\n"
-                    f"DATA TO TRANSLATE (JSON):\n{json.dumps(payload, ensure_ascii=False)}"
-                )
-
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ]
-
-
-                # openai
-                chat_completion = await client.chat.completions.create(
-                    messages=cast(Any, messages),
-                    model=MODEL_NAME,
-                    temperature=0.1,
-                    max_tokens=4096
+    # ایندکس رشته‌ای -> ایندکس اصلی؛ مدل ایندکس‌ها را گاهی عدد و گاهی رشته برمی‌گرداند
+    expected = {str(item["index"]): item["index"] for item in chunk_data}
+    # بین تلاش‌ها حفظ می‌شود تا پاسخ ناقص دور ریخته نشود
+    translation_map: Dict[str, str] = {}
+    # ترجمه‌هایی که قانون ۱ را رعایت نکرده‌اند؛ فقط اگر ترمیم هم شکست بخورد استفاده می‌شوند
+    invalid_map: Dict[str, str] = {}
+    parsed = 0
+    # پیشوند ثابت (قوانین، مشخصات فیلم، واژه‌نامه) بین همه چانک‌های این فیلم مشترک است
+    prompt = film_prompt(title, genre, extra_context)
+    originals = {str(item["index"]): item["original"] for item in chunk_data}
+
+    def accept(obj: Dict[str, Any]) -> None:
+        nonlocal parsed
+        idx = str(obj.get("index", ""))
+        val = obj.get("translated", "")
+        if idx not in expected or idx in translation_map:
+            return
+        parsed += 1
+        if not isinstance(val, str) or not val.strip():
+            return
+        if LATIN_PATTERN.search(val):
+            invalid_map[idx] = val
+            return
+
+        translation_map[idx] = val
+        invalid_map.pop(idx, None)
+        if "terms" in obj:
+            prompt.learn(originals[idx], obj["terms"])
+        if on_item:
+            on_item(expected[idx], val)
+
+    attempt = 0
+    repair_rounds = 0
+    responded = False
+    started = time.perf_counter()
+
+    while True:
+        # فقط خطوطی که متن دارند و هنوز ترجمه معتبر ندارند ارسال می‌شوند
+        payload = [
+            {"index": item["index"], "original": item["original"]}
+            for item in chunk_data
+            if item["original"].strip() and str(item["index"]) not in translation_map
+        ]
+        if not payload:
+            break
+
+        try:
+            context = None
+            if responded:
+                context = _repair_context(chunk_data, {str(item["index"]) for item in payload}, translation_map)
+            messages = prompt.messages(payload, context)
+
+            estimated_tokens = (
+                math.ceil(sum(len(m["content"]) for m in messages) / 3.8)
+                + sum(estimate_output_tokens(item["original"]) for item in payload)
+            )
+
+            parsed_before = parsed
+            finish_reason = await _stream_translations(messages, estimated_tokens, accept)
+            received = parsed - parsed_before
+
+            if not received:
+                raise ValueError("No valid translation objects detected in response.")
+
+            missing = {str(item["index"]) for item in payload} - translation_map.keys()
+            if missing and finish_reason == "length":
+                # پاسخ بریده شده؛ تلاش بعدی فقط خطوط باقی‌مانده را می‌فرستد
+                raise ValueError(f"Response truncated after {received} items, {len(missing)} missing")
+
+            responded = True
+
+            if not missing:
+                break
+            if repair_rounds >= MAX_REPAIR_ROUNDS:
+                logger.warning(f"⚠️ Index mismatch for {title}. Unrepaired: {missing}")
+                break
+
+            # ترمیم هدفمند: فقط همین خطوط با چند خط همسایه دوباره فرستاده می‌شوند
+            repair_rounds += 1
+            REPAIR_ROUNDS.inc()
+            logger.info(f"Repairing {len(missing)} lines for {title} (round {repair_rounds}/{MAX_REPAIR_ROUNDS})")
+
+        except CircuitOpenError:
+            # بار اضافه روی provider از کار افتاده نمی‌گذاریم؛ فراخواننده 503 برمی‌گرداند
+            raise
+
+        except Exception as e:
+            kind = classify_error(e)
+            retry_after = retry_after_seconds(e)
+
+            if not retry_policy.should_retry(kind, attempt):
+                logger.error(
+                    f"Fireworks Sync Failure for {title} after {attempt + 1} attempts ({kind}): {e}",
+                    exc_info=True
                 )
-
-                # groq
-                formatted_messages = cast(Iterable[ChatCompletionMessageParam], cast(Any, messages))
-                # chat_completion = await client.chat.completions.create(
-                #     messages=formatted_messages,
-                #     model=MODEL_NAME,
-                #     temperature=0.1 ,
-                #     max_tokens=4096,
-                #     response_format=cast(Any, {"type": "json_object"})
-                # )
-
-                raw_content = chat_completion.choices[0].message.content
-                if not raw_content:
-                    raise ValueError("Fireworks returned an empty response.")
-
-                clean_json = safe_extract_json(raw_content)
-                if not clean_json:
-                    raise ValueError(f"No valid JSON object detected in response: {raw_content[:100]}...")
-
-                parsed_response = json.loads(clean_json)
-
-                # استخراج لیست نتایج
-                raw_results = []
-                if isinstance(parsed_response, list):
-                    raw_results = parsed_response
-                elif isinstance(parsed_response, dict):
-                    if "results" in parsed_response:
-                        raw_results = parsed_response["results"]
-                    elif "translations" in parsed_response:
-                        raw_results = parsed_response["translations"]
-                    elif len(parsed_response) == 1:
-                        raw_results = list(parsed_response.values())[0]
-
-                # --- PROTECT AGAINST INVALID TYPE ---
-                if not isinstance(raw_results, list):
-                    logger.error(f"Type Mismatch: Expected list, got {type(raw_results).__name__} for {title}")
-                    raise ValueError("Model returned invalid results structure")
-
-                # --- GUARANTEED SYNC LOGIC ---
-                expected_indices = {str(item["index"]) for item in chunk_data}
-                received_indices = {str(item.get("index", "")) for item in raw_results}
-
-                missing = expected_indices - received_indices
-                if missing:
-                    logger.warning(f"⚠️ Index mismatch for {title}. Missing: {missing}")
-                # ------------------------------------
-
-                # --- GUARANTEED SYNC LOGIC ---
-                translation_map = {}
-                for item in raw_results:
-                    try:
-                        idx = str(item.get("index", ""))
-                        val = item.get("translated", "")
-                        if idx and val:
-                            translation_map[idx] = val
-                    except (KeyError, TypeError, AttributeError):
-                        continue
-
-                final_sync_results: List[Dict[str, Any]] = []
-                for original_item in chunk_data:
-                    orig_idx = str(original_item["index"])
-                    translated_text = translation_map.get(orig_idx, original_item["original"])
-
-                    final_sync_results.append({
-                        "index": original_item["index"],
-                        "translated": translated_text
-                    })
-
-                return final_sync_results
-
-            except Exception as e:
-                error_str = str(e).lower()
-                # بررسی محدودیت نرخ درخواست یا خطاهای مربوطه
-                is_rate_limit = any(
-                    x in error_str for x in ["rate limit", "429", "too many requests", "scraping github"])
-
-                if is_rate_limit and attempt < max_retries:
-                    logger.warning(
-                        f"⚠️ Limit hit for {title}. Attempt {attempt + 1}/{max_retries}. Sleeping 2 minutes...")
-                    await asyncio.sleep(retry_delay)
-                    continue  # تکرار همین چانک از ابتدا
-
-                # برای خطاهای غیر از لیمیت یا تمام شدن تلاش‌ها
-                if attempt < max_retries:
-                    logger.error(
-                        f"⚠️ Unexpected error for {title}: {str(e)}. Attempt {attempt + 1}/{max_retries}. Retrying...")
-                    await asyncio.sleep(10)
-                    continue
-
-                logger.error(f"Fireworks Sync Failure after {max_retries} retries: {str(e)}", exc_info=True)
-                # بازگرداندن مقدار پیش‌فرض در صورت شکست نهایی
-                return [{"index": item["index"], "translated": item.get("original", "Error")} for item in chunk_data]
-
-            finally:
-                # مکث ثابت بین هر چانک (موفق یا ناموفق)
-                await asyncio.sleep(12)
-
-        # مقدار بازگشتی نهایی برای آرام کردن تحلیل‌گر تایپ
-        return [{"index": item["index"], "translated": item.get("original", "Error")} for item in chunk_data]
\ No newline at end of file
+                break
+
+            delay = retry_policy.delay(attempt, kind, retry_after)
+            attempt += 1
+            logger.warning(
+                f"⚠️ {kind} for {title}: {e}. Attempt {attempt}/{retry_policy.max_attempts}. "
+                f"Retrying in {delay:.1f}s..."
+            )
+            RETRIES.labels(kind=kind).inc()
+            with timed(RETRY_SLEEP_SECONDS.labels(kind=kind), span="retry_sleep", kind=kind, attempt=attempt):
+                await asyncio.sleep(delay)
+
+    # --- GUARANTEED SYNC LOGIC ---
+    final_sync_results: List[Dict[str, Any]] = []
+    for original_item in chunk_data:
+        orig_idx = str(original_item["index"])
+        if orig_idx in translation_map:
+            final_sync_results.append({
+                "index": original_item["index"],
+                "translated": translation_map[orig_idx]
+            })
+        elif orig_idx in invalid_map:
+            # ترجمه با حروف لاتین بهتر از متن انگلیسی است، ولی در حافظه ذخیره نمی‌شود
+            final_sync_results.append({
+                "index": original_item["index"],
+                "translated": invalid_map[orig_idx],
+                "fallback": True
+            })
+        else:
+            final_sync_results.append(_fallback_item(original_item))
+
+    elapsed = time.perf_counter() - started
+    CHUNK_SECONDS.observe(elapsed)
+    record_span(
+        "chunk", started, elapsed,
+        lines=len(chunk_data), attempts=attempt + 1, repair_rounds=repair_rounds,
+        fallback=sum(1 for item in final_sync_results if item.get("fallback"))
+    )
+    return final_sync_results
@@ -0,0 +1,144 @@
+import importlib.util
+from typing import Optional, Dict, Any, AsyncIterator
+import httpx
+from app.utils.config import env_int, env_float, env_bool
+from app.utils.logger import setup_logger
+
+logger = setup_logger("llm-http")
+
+# یک pool مشترک برای همه providerها؛ اتصال‌های TLS بین چانک‌ها دوباره استفاده می‌شوند
+LLM_HTTP_MAX_CONNECTIONS = env_int("LLM_HTTP_MAX_CONNECTIONS", 64)
+LLM_HTTP_MAX_KEEPALIVE = env_int("LLM_HTTP_MAX_KEEPALIVE", 32)
+LLM_HTTP_KEEPALIVE_EXPIRY = env_float("LLM_HTTP_KEEPALIVE_EXPIRY", 60.0)
+# HTTP/2 اختیاری است و پکیج h2 را لازم دارد (pip install httpx[http2])؛ h2 جزو وابستگی‌ها نیست
+LLM_HTTP2 = env_bool("LLM_HTTP2", False)
+LLM_CONNECT_TIMEOUT = env_float("LLM_CONNECT_TIMEOUT", 10.0)
+# فاصله مجاز بین دو تکه از پاسخ استریم
+LLM_READ_TIMEOUT = env_float("LLM_READ_TIMEOUT", 60.0)
+LLM_WRITE_TIMEOUT = env_float("LLM_WRITE_TIMEOUT", 30.0)
+LLM_POOL_TIMEOUT = env_float("LLM_POOL_TIMEOUT", 30.0)
+# سقف کل یک فراخوانی از ارسال تا آخرین توکن (در ProviderRouter اعمال می‌شود)
+LLM_TOTAL_TIMEOUT = env_float("LLM_TOTAL_TIMEOUT", 300.0)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body wrapper that releases the in-flight count once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, transport: "_TrackedTransport"):
+        self._stream = stream
+        self._transport = transport
+        self._released = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._transport.active -= 1
+
+
+class _TrackedTransport(httpx.AsyncHTTPTransport):
+    """Counts requests from send until their (streamed) body is closed."""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.active = 0
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.active += 1
+        self.requests += 1
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.active -= 1
+            raise
+        response.stream = _TrackedStream(response.stream, self)
+        return response
+
+    def connection_counts(self) -> Dict[str, int]:
+        # httpcore اتصال‌ها را فقط از طریق pool داخلی httpx نشان می‌دهد
+        connections = getattr(getattr(self, "_pool", None), "connections", [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"open": len(connections), "idle": idle}
+
+
+class LLMHttpPool:
+    """
+    The shared httpx client behind the provider SDKs: bounded pool, keep-alive, optional HTTP/2
+    (LLM_HTTP2, needs h2) and per-phase timeouts. Started and closed by the app lifespan; started lazily
+    on first use otherwise (scripts, benchmarks).
+    """
+
+    def __init__(
+            self,
+            max_connections: int,
+            max_keepalive: int,
+            keepalive_expiry: float,
+            http2: bool,
+            timeout: httpx.Timeout
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.warning("LLM_HTTP2 is set but h2 is not installed; LLM calls use HTTP/1.1")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[_TrackedTransport] = None
+
+    def start(self) -> None:
+        if self._client is not None:
+            return
+        self._transport = _TrackedTransport(limits=self.limits, http2=self.http2)
+        self._client = httpx.AsyncClient(transport=self._transport, timeout=self.timeout)
+        logger.info(
+            f"Started LLM HTTP pool ({self.limits.max_connections} connections, "
+            f"{self.limits.max_keepalive_connections} keep-alive, {'HTTP/2' if self.http2 else 'HTTP/1.1'})"
+        )
+
+    def client(self) -> httpx.AsyncClient:
+        self.start()
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client, self._transport = self._client, None, None
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        transport = self._transport
+        counts = transport.connection_counts() if transport else {"open": 0, "idle": 0}
+        active = transport.active if transport else 0
+        max_connections = self.limits.max_connections
+        return {
+            "started": transport is not None,
+            "http2": self.http2,
+            "max_connections": max_connections,
+            "open_connections": counts["open"],
+            "idle_connections": counts["idle"],
+            "active_requests": active,
+            # با HTTP/1.1 هر درخواست یک اتصال می‌گیرد؛ مازاد منتظر آزاد شدن اتصال است
+            "queued_requests": 0 if self.http2 else max(0, active - max_connections),
+            "saturation": round(min(1.0, active / max_connections), 3) if max_connections else 0.0,
+            "total_requests": transport.requests if transport else 0
+        }
+
+
+llm_http = LLMHttpPool(
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP2,
+    httpx.Timeout(
+        connect=LLM_CONNECT_TIMEOUT, read=LLM_READ_TIMEOUT, write=LLM_WRITE_TIMEOUT, pool=LLM_POOL_TIMEOUT
+    )
+)
@@ -0,0 +1,154 @@
+import time
+import uuid
+import asyncio
+from typing import Dict, List, Optional, Any
+from app.utils.config import env_int
+from app.utils.logger import setup_logger
+from app.services.pipeline import run_translation_pipeline
+
+logger = setup_logger("translation-jobs")
+
+JOB_WORKERS = env_int("JOB_WORKERS", 2)
+JOB_QUEUE_SIZE = env_int("JOB_QUEUE_SIZE", 16)
+JOB_TTL_SECONDS = env_int("JOB_TTL_SECONDS", 6 * 3600)
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+class TranslationJob:
+    def __init__(self, filename: str, content: bytes, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.params = params
+        self.content: Optional[bytes] = content
+
+        self.status = "queued"  # queued | running | completed | failed
+        self.stage = "queued"
+        self.total_chunks = 0
+        self.done_chunks = 0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._translate_started_at: Optional[float] = None
+
+    def update_progress(self, stage: str, done: int, total: int) -> None:
+        if stage == "translating" and self._translate_started_at is None:
+            self._translate_started_at = time.time()
+        self.stage = stage
+        if stage == "translating":
+            self.done_chunks, self.total_chunks = done, total
+
+    def eta_seconds(self) -> Optional[float]:
+        # میانگین زمان هر چانک تا اینجا × چانک‌های باقی‌مانده
+        if self.status != "running" or not self._translate_started_at or not self.done_chunks:
+            return None
+        per_chunk = (time.time() - self._translate_started_at) / self.done_chunks
+        return round(per_chunk * (self.total_chunks - self.done_chunks), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": {
+                "done_chunks": self.done_chunks,
+                "total_chunks": self.total_chunks,
+                "percent": round(100 * self.done_chunks / self.total_chunks, 1) if self.total_chunks else None,
+                "eta_seconds": self.eta_seconds()
+            },
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class JobManager:
+    """
+    Bounded queue of translation jobs served by a fixed pool of background workers.
+    A full queue is reported to the caller instead of accepting more uploads.
+    """
+
+    def __init__(self, workers: int, queue_size: int, ttl_seconds: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl_seconds = ttl_seconds
+        self.jobs: Dict[str, TranslationJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} translation workers (queue size {self.queue_size})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, filename: str, content: bytes, params: Dict[str, Any]) -> TranslationJob:
+        if self._queue is None:
+            raise RuntimeError("Job manager is not running")
+        self._evict_expired()
+
+        job = TranslationJob(filename, content, params)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Translation queue is full, retry later")
+
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[TranslationJob]:
+        return self.jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _worker(self, worker_no: int) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = job.stage = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await run_translation_pipeline(
+                    content=job.content,
+                    filename=job.filename,
+                    progress=job.update_progress,
+                    output_key=job.id,
+                    **job.params
+                )
+                job.status = job.stage = "completed"
+            except asyncio.CancelledError:
+                job.status, job.error = "failed", "Worker stopped"
+                raise
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.filename}) failed: {e}", exc_info=True)
+                job.status = job.stage = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.content = None  # بایت‌های فایل دیگر لازم نیست
+                self._queue.task_done()
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+job_manager = JobManager(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TTL_SECONDS)
@@ -0,0 +1,398 @@
+import os
+import re
+import uuid
+import asyncio
+import functools
+from typing import List, Dict, Optional, Callable, Tuple, Any
+from app.utils.logger import setup_logger
+from app.utils.parser import Cue
+from app.utils.preprocess import preprocess_subtitle
+from app.utils.tones import get_genre_prompt
+from app.utils.translation_memory import partition_blocks, remember_translations, expand_duplicates
+from app.utils.storage import translation_store, STORAGE_DIR
+from app.utils.checkpoint import TranslationCheckpoint, evict_checkpoints
+from app.utils.chunker import pack_chunks
+from app.utils.local_rules import LOCAL_FAST_PATH, resolve_locally
+from app.utils.sentences import SENTENCE_MERGE, merge_sentences, expand_unit, expand_units
+from app.utils.writer import finalize_srt
+from app.utils.fingerprint import content_fingerprint
+from app.utils.metrics import STAGE_SECONDS, TRANSLATIONS, CUES, TIMELINE_ADJUSTMENTS, timed
+from app.services.retry import CircuitOpenError
+from app.services.fireworks import translate_chunk, MODEL_NAME, PROMPT_VERSION
+from app.services.prompt import film_prompt
+from app.services.providers import provider_router
+from app.services.cpu_pool import cpu_pool
+
+logger = setup_logger("srt-pipeline")
+
+SRT_OUTPUT_DIR = os.path.join(STORAGE_DIR, "srt")
+
+# (stage, done, total) -> None
+ProgressCallback = Callable[[str, int, int], None]
+# {"index", "start", "end", "translated"} -> None
+CueCallback = Callable[[Dict], None]
+
+
+def _instrumented(kind: str):
+    """Counts runs by outcome and times the whole pipeline as the `{kind}_total` stage."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            outcome = "error"
+            try:
+                with timed(STAGE_SECONDS.labels(stage=f"{kind}_total")):
+                    result = await fn(*args, **kwargs)
+                outcome = "success"
+                return result
+            except CircuitOpenError:
+                outcome = "unavailable"
+                raise
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                TRANSLATIONS.labels(kind=kind, outcome=outcome).inc()
+        return wrapper
+    return decorate
+
+
+def make_clean_title(filename: str) -> Tuple[str, str]:
+    extracted_title = os.path.splitext(filename)[0]
+    # پاکسازی نام فیلم برای استفاده در مسیرها
+    clean_title = re.sub(r'[^\w\-]', '', extracted_title.lower().replace(" ", "-"))
+    return extracted_title, clean_title
+
+
+async def translate_blocks(
+        final_blocks: List[Cue],
+        clean_title: str,
+        genre: str,
+        extra_context: Optional[str],
+        chunk_size: int,
+        log_title: str,
+        progress: Optional[ProgressCallback] = None,
+        checkpoint: Optional[TranslationCheckpoint] = None,
+        on_cue: Optional[Callable[[Any, str], None]] = None,
+        merge: bool = False
+) -> Tuple[List[Dict], Dict]:
+    total_cues = len(final_blocks)
+    # حالت جمله‌ای: cueهای یک جمله یک آیتم می‌شوند؛ حافظه، تکرار و چانک‌ها روی همین واحدها کار می‌کنند
+    members: Dict[int, List[Cue]] = {}
+    if merge:
+        final_blocks, members = merge_sentences(final_blocks)
+
+    # مسیر محلی: اعداد، حروف ندا و خطوط نویز قبل از چانک‌بندی بدون مدل ترجمه می‌شوند
+    local_items: List[Dict] = []
+    if LOCAL_FAST_PATH:
+        with timed(STAGE_SECONDS.labels(stage="local"), span="local"):
+            local_items, final_blocks = resolve_locally(final_blocks)
+
+    with timed(STAGE_SECONDS.labels(stage="memory"), span="memory"):
+        # حافظه ترجمه: خطوط تکراری یک بار ارسال می‌شوند و خطوط کش‌شده اصلاً ارسال نمی‌شوند.
+        # خواندن SQLite مثل translation_store در thread انجام می‌شود
+        memory_hits, pending_blocks, duplicates, pending_keys = await asyncio.to_thread(
+            partition_blocks, final_blocks, get_genre_prompt(genre), MODEL_NAME, PROMPT_VERSION
+        )
+
+        # ادامه از چک‌پوینت: خطوطی که در اجرای قبلی ترجمه شده‌اند دوباره ارسال نمی‌شوند
+        resumed_items = []
+        if checkpoint:
+            done = await asyncio.to_thread(checkpoint.load)
+            resumed_items = [
+                {"index": b.index, "translated": done[b.index]}
+                for b in pending_blocks if b.index in done
+            ]
+            pending_blocks = [b for b in pending_blocks if b.index not in done]
+
+    llm_cues = sum(len(members.get(b.index, (b,))) for b in pending_blocks)
+    memory_stats = {
+        "local": len(local_items),
+        "hits": len(memory_hits),
+        "resumed": len(resumed_items),
+        "translated": len(pending_blocks),
+        "duplicates": sum(map(len, duplicates.values())),
+        # سهم cueهای اصلی که به مدل نمی‌رسند (محلی، حافظه، تکراری، چک‌پوینت)
+        "llm_skipped_ratio": round(1 - llm_cues / total_cues, 4) if total_cues else 0.0
+    }
+    if merge:
+        memory_stats["merged_units"] = len(members)
+        memory_stats["merged_cues"] = sum(map(len, members.values()))
+    logger.info(
+        f"[{log_title}] Translation memory: {memory_stats['local']} local, {memory_stats['hits']} hits, "
+        f"{memory_stats['resumed']} resumed, "
+        f"{memory_stats['translated']} to translate, {memory_stats['duplicates']} duplicates, "
+        f"{memory_stats['llm_skipped_ratio']:.1%} of cues skip the LLM"
+        + (f", {len(members)} sentence units from {memory_stats['merged_cues']} cues" if merge else "")
+    )
+
+    def emit(index: Any, translated: str) -> None:
+        if on_cue:
+            for unit_index in (index, *duplicates.get(index, ())):
+                for cue_index, text in expand_unit(unit_index, translated, members):
+                    on_cue(cue_index, text)
+
+    for item in local_items + memory_hits + resumed_items:
+        emit(item["index"], item["translated"])
+
+    # چانک‌ها بر اساس بودجه توکن مدل بسته می‌شوند؛ chunk_size فقط سقف تعداد خطوط است
+    # پیشوند واقعی فیلم (قوانین، مشخصات، واژه‌نامه در بزرگ‌ترین اندازه‌اش) از بودجه ورودی کم می‌شود
+    overhead_tokens = film_prompt(clean_title, genre, extra_context).reserved_tokens()
+    chunks = pack_chunks(pending_blocks, provider_router.models, chunk_size, overhead_tokens)
+    total_chunks = len(chunks)
+    done_chunks = 0
+    if progress:
+        progress("translating", 0, total_chunks)
+
+    # ارسال هم‌زمان چانک‌ها؛ نرخ و هم‌زمانی هر provider را dispatcher خودش کنترل می‌کند
+    async def translate_batch(chunk_no: int, batch: List[Cue]) -> List[Dict]:
+        nonlocal done_chunks
+        current_chunk_data = [{"index": b.index, "original": b.clean} for b in batch]
+
+        # ارسال به سرویس Fireworks
+        translated_batch = await translate_chunk(
+            chunk_data=current_chunk_data,
+            title=clean_title,
+            genre=genre,
+            extra_context=extra_context,
+            on_item=emit
+        )
+        if checkpoint:
+            # fsync روی event loop بقیه درخواست‌ها را معطل می‌کند
+            await asyncio.to_thread(checkpoint.append, translated_batch)
+        done_chunks += 1
+        if progress:
+            progress("translating", done_chunks, total_chunks)
+        logger.info(f"[{log_title}] Processed chunk {chunk_no}/{total_chunks}")
+        return translated_batch
+
+    # gather ترتیب ورودی را حفظ می‌کند، پس نتایج به ترتیب ایندکس برمی‌گردند.
+    # با شکست یک چانک بقیه تا انتها اجرا می‌شوند تا نتیجه‌شان در چک‌پوینت بماند.
+    with timed(STAGE_SECONDS.labels(stage="translate"), span="translate", chunks=total_chunks):
+        chunk_results = await asyncio.gather(*(
+            translate_batch(chunk_no, batch)
+            for chunk_no, batch in enumerate(chunks, start=1)
+        ), return_exceptions=True)
+
+    all_translated_items = []
+    for translated_batch in chunk_results:
+        if isinstance(translated_batch, BaseException):
+            raise translated_batch
+        all_translated_items.extend(translated_batch)
+
+    await asyncio.to_thread(remember_translations, pending_blocks, all_translated_items, pending_keys)
+    memory_stats["fallbacks"] = sum(1 for item in all_translated_items if item.get("fallback"))
+    CUES.labels(source="local").inc(memory_stats["local"])
+    CUES.labels(source="memory").inc(memory_stats["hits"])
+    CUES.labels(source="checkpoint").inc(memory_stats["resumed"])
+    CUES.labels(source="duplicate").inc(memory_stats["duplicates"])
+    CUES.labels(source="llm").inc(memory_stats["translated"] - memory_stats["fallbacks"])
+    CUES.labels(source="fallback").inc(memory_stats["fallbacks"])
+    all_translated_items = local_items + expand_duplicates(
+        memory_hits + resumed_items + all_translated_items, duplicates
+    )
+    # ترجمه هر واحد جمله‌ای به نسبت مدت زمان بین cueهای اصلی‌اش تقسیم می‌شود
+    all_translated_items = expand_units(all_translated_items, members)
+    all_translated_items.sort(key=lambda item: item["index"])
+    return all_translated_items, memory_stats
+
+
+async def finish_checkpoint(checkpoint: TranslationCheckpoint, memory_stats: Dict) -> None:
+    if memory_stats["fallbacks"]:
+        # چک‌پوینت‌های نگه‌داشته‌شده تا CHECKPOINT_RETENTION_HOURS می‌مانند
+        await asyncio.to_thread(evict_checkpoints)
+    else:
+        await asyncio.to_thread(checkpoint.clear)
+
+
+def srt_output_path(clean_title: str, output_key: str) -> str:
+    # هر اجرا فایل خودش را دارد؛ اجرای بعدی با همان عنوان، فایل دانلودشده/کش‌شده قبلی را عوض نمی‌کند
+    return os.path.join(SRT_OUTPUT_DIR, clean_title, f"{output_key}.srt")
+
+
+def output_filename(clean_title: str) -> str:
+    """Download/archive name of a translated file (the path on disk is per run)."""
+    return f"{clean_title}-persian.srt"
+
+
+async def write_outputs(
+        clean_title: str,
+        genre: str,
+        content_hash: str,
+        cues: List[Cue],
+        translated_items: List[Dict],
+        output_key: str
+) -> Tuple[str, Dict[str, int]]:
+    """Returns (SRT path, timeline adjustment counts)."""
+    with timed(STAGE_SECONDS.labels(stage="write"), span="write", title=clean_title):
+        # نقشه نگاشت ایندکس به متن ترجمه شده؛ زمان‌بندی برای طول ترجمه اصلاح و فایل SRT اتمیک نوشته می‌شود
+        trans_map = {str(item["index"]): item["translated"] for item in translated_items}
+        final_path, timeline_stats = await cpu_pool.run(
+            finalize_srt, srt_output_path(clean_title, output_key), cues, trans_map
+        )
+        for kind, count in timeline_stats.items():
+            TIMELINE_ADJUSTMENTS.labels(kind=kind).inc(count)
+
+        # رکورد پشتیبان (قابل جستجو با عنوان/هش) بعد از فایل ثبت می‌شود تا به فایل موجود اشاره کند
+        await asyncio.to_thread(
+            translation_store.save, clean_title, content_hash, genre, MODEL_NAME, final_path, translated_items
+        )
+        return final_path, timeline_stats
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@_instrumented("single")
+async def run_translation_pipeline(
+        content: bytes,
+        filename: str,
+        chunk_size: int,
+        genre: str,
+        extra_context: Optional[str],
+        progress: Optional[ProgressCallback] = None,
+        on_cue: Optional[CueCallback] = None,
+        merge_sentences: Optional[bool] = None,
+        output_key: Optional[str] = None,
+        decoded_text: Optional[str] = None
+) -> Dict:
+    """
+    decode → parse → normalize → clean → translate → write; returns the /translate response body.
+    The SRT goes to storage/srt/<title>/<output_key>.srt (a fresh id by default).
+    `decoded_text`, when given, is `content` already decoded and is not decoded again.
+    """
+    extracted_title, clean_title = make_clean_title(filename)
+    merge = SENTENCE_MERGE if merge_sentences is None else merge_sentences
+    checkpoint = TranslationCheckpoint(content_fingerprint(content, {
+        "genre": genre,
+        "extra_context": extra_context,
+        "model": MODEL_NAME,
+        "prompt_version": PROMPT_VERSION,
+        "merge_sentences": merge
+    }))
+
+    if progress:
+        progress("preprocessing", 0, 0)
+    # پردازش CPU-محور روی pool اجرا می‌شود تا فایل بزرگ بقیه درخواست‌ها را معطل نکند
+    with timed(STAGE_SECONDS.labels(stage="preprocess"), span="preprocess", bytes=len(content)):
+        cues = await cpu_pool.run(preprocess_subtitle, content, decoded_text)
+
+    emit_cue = None
+    if on_cue:
+        timings = {b.index: b for b in cues}
+
+        def emit_cue(index: Any, translated: str) -> None:
+            block = timings[index]
+            on_cue({"index": index, "start": block.start, "end": block.end, "translated": translated})
+
+    all_translated_items, memory_stats = await translate_blocks(
+        cues, clean_title, genre, extra_context, chunk_size, extracted_title,
+        progress, checkpoint, emit_cue, merge
+    )
+
+    if progress:
+        progress("writing", 0, 0)
+    final_path, timeline_stats = await write_outputs(
+        clean_title, genre, content_fingerprint(content, {}), cues, all_translated_items,
+        output_key or uuid.uuid4().hex
+    )
+
+    # اگر خطی با متن اصلی پر شده، چک‌پوینت می‌ماند تا ارسال دوباره فقط همان‌ها را ترجمه کند
+    await finish_checkpoint(checkpoint, memory_stats)
+
+    return {
+        "status": "success",
+        "message": "Translation completed and file saved.",
+        "file_info": {
+            "title": clean_title,
+            "path": final_path,
+            "filename": output_filename(clean_title),
+            "total_lines": len(cues)
+        },
+        "memory": memory_stats,
+        "timeline": timeline_stats
+    }
+
+
+@_instrumented("batch")
+async def run_batch_pipeline(
+        files: List[Tuple[str, bytes]],
+        chunk_size: int,
+        genre: str,
+        extra_context: Optional[str],
+        series_title: Optional[str] = None,
+        merge_sentences: Optional[bool] = None
+) -> Tuple[Dict, List[Tuple[str, bytes]]]:
+    """
+    Translates several episodes as one job: all cues share one chunk schedule and rate budget,
+    and lines repeated across episodes (recaps, intros, names) are translated once.
+    Returns (summary, [(output filename, SRT bytes)]).
+    """
+    if not files:
+        raise ValueError("No .srt files in batch")
+
+    series_title = series_title or os.path.commonprefix([os.path.splitext(name)[0] for name, _ in files])
+    extracted_series, clean_series = make_clean_title(f"{series_title.strip(' -_.') or 'batch'}.srt")
+
+    episodes = []
+    combined_blocks: List[Cue] = []
+    # ایندکس سراسری -> (شماره قسمت، ایندکس اصلی)
+    origin: Dict[int, Tuple[int, Any]] = {}
+
+    with timed(STAGE_SECONDS.labels(stage="preprocess"), span="preprocess", files=len(files)):
+        parsed = await asyncio.gather(*(cpu_pool.run(preprocess_subtitle, content) for _, content in files))
+    for episode_no, ((filename, content), cues) in enumerate(zip(files, parsed)):
+        _, clean_title = make_clean_title(filename)
+        episodes.append({
+            "filename": filename,
+            "clean_title": clean_title,
+            "cues": cues,
+            "fingerprint": content_fingerprint(content, {})
+        })
+        for block in cues:
+            global_index = len(origin) + 1
+            origin[global_index] = (episode_no, block.index)
+            combined_blocks.append(Cue(global_index, block.start_ms, block.end_ms, block.text, block.clean))
+
+    merge = SENTENCE_MERGE if merge_sentences is None else merge_sentences
+    checkpoint = TranslationCheckpoint(content_fingerprint(
+        "\n".join(e["fingerprint"] for e in episodes).encode("utf-8"),
+        {"genre": genre, "extra_context": extra_context, "model": MODEL_NAME, "prompt_version": PROMPT_VERSION,
+         "merge_sentences": merge}
+    ))
+
+    # مرز قسمت‌ها جمله را قطع می‌کند: زمان شروع قسمت بعد از پایان قسمت قبل عقب‌تر است
+    all_translated_items, memory_stats = await translate_blocks(
+        combined_blocks, clean_series, genre, extra_context, chunk_size,
+        f"{extracted_series} ({len(files)} files)", checkpoint=checkpoint, merge=merge
+    )
+
+    per_episode: List[List[Dict]] = [[] for _ in episodes]
+    for item in all_translated_items:
+        episode_no, index = origin[item["index"]]
+        per_episode[episode_no].append({**item, "index": index})
+
+    outputs = []
+    summary_files = []
+    for episode, items in zip(episodes, per_episode):
+        final_path, timeline_stats = await write_outputs(
+            episode["clean_title"], genre, episode["fingerprint"], episode["cues"], items, uuid.uuid4().hex
+        )
+        outputs.append((output_filename(episode["clean_title"]), await asyncio.to_thread(_read_file, final_path)))
+        summary_files.append({
+            "filename": episode["filename"],
+            "path": final_path,
+            "total_lines": len(episode["cues"]),
+            "timeline": timeline_stats
+        })
+
+    await finish_checkpoint(checkpoint, memory_stats)
+
+    summary = {
+        "status": "success",
+        "title": clean_series,
+        "files": summary_files,
+        "memory": memory_stats
+    }
+    return summary, outputs
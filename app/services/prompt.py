@@ -0,0 +1,157 @@
+import re
+import math
+import json
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from app.utils.config import env_int
+from app.utils.tones import get_genre_prompt
+from app.utils.chunker import CHARS_PER_TOKEN, PERSIAN_CHARS_PER_TOKEN
+
+# سقف واژه‌نامه هر فیلم؛ هر واژه پیشوند ثابت همه درخواست‌های بعدی را بلندتر می‌کند
+GLOSSARY_MAX_TERMS = env_int("PROMPT_GLOSSARY_MAX_TERMS", 150)
+GLOSSARY_MAX_TERM_CHARS = 40
+# سقف توکن یک خط "term = املای فارسی"؛ هر دو طرف حداکثر GLOSSARY_MAX_TERM_CHARS کاراکترند
+GLOSSARY_TERM_MAX_TOKENS = (
+    math.ceil((GLOSSARY_MAX_TERM_CHARS + len(" = \n")) / CHARS_PER_TOKEN)
+    + math.ceil(GLOSSARY_MAX_TERM_CHARS / PERSIAN_CHARS_PER_TOKEN)
+)
+GLOSSARY_HEADER = "\n\nGLOSSARY (reuse these exact spellings):\n"
+REPAIR_PREAMBLE = (
+    "REPAIR REQUEST: the lines below were missing, empty or contained Latin letters.\n"
+    "Translate ONLY the DATA lines, in Persian script only.\n"
+    "NEIGHBOURING LINES (reference only, do NOT return them):\n"
+)
+DATA_HEADER = "DATA TO TRANSLATE (JSON):\n"
+# تعداد فیلم‌هایی که پیشوند و واژه‌نامه‌شان در حافظه می‌ماند
+MAX_FILM_PROMPTS = 256
+
+# قانون ۱ پرامپت: ترجمه نباید حرف لاتین داشته باشد
+LATIN_PATTERN = re.compile(r"[A-Za-z]")
+
+SYSTEM_PROMPT = (
+    "You are a top-tier Persian subtitle translator for Iranian movie audiences.\n"
+
+    "TRANSLATION APPROACH:\n"
+    "• Translate into natural, authentic, modern spoken Iranian Persian (Tehrani colloquial style – 2020s)\n"
+    "• Turn idioms, slang, metaphors, sarcasm, humor into the most natural Persian equivalents – NEVER translate literally\n"
+    "• Preserve ORIGINAL MEANING and emotional tone exactly\n"
+    "• Keep translations concise - match subtitle timing\n\n"
+
+    "CRITICAL RULES:\n"
+    "1. Translations contain ONLY Persian script (no Latin/Cyrillic letters)\n"
+    "2. Use colloquial Persian forms\n"
+    "3. Preserve irony/sarcasm - don't make it literal\n"
+    "4. Use MODERN vocabulary (2020s Iranian speech)\n"
+    "5. For names/proper nouns: Transliterate to Persian script—never translate meanings\n"
+    "6. Keep character/term consistency across the movie - reuse the GLOSSARY spellings exactly\n"
+    "7. For ambiguous lines: Choose most context-appropriate natural Persian interpretation\n\n"
+
+    "TECHNICAL REQUIREMENTS:\n"
+    "• Return JSON with 'results' array containing 'index' and 'translated'\n"
+    "• Use EXACT same index numbers from input (vital for SRT sync)\n"
+    "• One translation per line - no merging/splitting\n"
+    "• Array order doesn't matter - indexes handle mapping\n"
+    "• When a line has a character name or recurring term that is NOT in the GLOSSARY, add "
+    "'terms' to that line's object: {\"<English term>\": \"<Persian spelling>\"}\n\n"
+
+    "Example output format:\n"
+    '{"results": [{"index": "1", "translated": "ترجمه فارسی"}, '
+    '{"index": "2", "translated": "سلام جان", "terms": {"John": "جان"}}]}'
+)
+
+
+class FilmPrompt:
+    """
+    Byte-stable prompt prefix for one film: system rules, film metadata and an append-only glossary.
+    Only the user message (the chunk's data) changes between calls, so provider prefix caches hit.
+    """
+
+    def __init__(self, title: str, genre: str, extra_context: Optional[str]):
+        self.header = (
+            f"{SYSTEM_PROMPT}\n\n"
+            "FILM:\n"
+            f"Title: {title}\n"
+            f"Primary Tone: {get_genre_prompt(genre)}\n"
+            f"Genres: {genre}\n"
+            f"Scene Context: {extra_context if extra_context else 'N/A'}"
+        )
+        self.glossary: Dict[str, str] = {}
+        # کلید کوچک‌شده -> واژه، برای جلوگیری از تکرار با حروف بزرگ/کوچک متفاوت
+        self._known: Dict[str, str] = {}
+        self._glossary_text = ""
+
+    def system_message(self) -> str:
+        if not self.glossary:
+            return self.header
+        # واژه‌های جدید فقط به انتها اضافه می‌شوند، پس پیشوند درخواست‌های قبلی دست نمی‌خورد
+        return f"{self.header}{GLOSSARY_HEADER}{self._glossary_text}"
+
+    def reserved_tokens(self) -> int:
+        """
+        Tokens each request of this film needs besides its lines: the system message with the glossary
+        at its full GLOSSARY_MAX_TERMS size (it grows while chunks are in flight) and the repair preamble.
+        """
+        fixed = len(self.header) + len(GLOSSARY_HEADER) + len(REPAIR_PREAMBLE) + len(DATA_HEADER)
+        return math.ceil(fixed / CHARS_PER_TOKEN) + GLOSSARY_MAX_TERMS * GLOSSARY_TERM_MAX_TOKENS
+
+    def messages(
+            self,
+            payload: List[Dict[str, Any]],
+            context: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system_message()},
+            {"role": "user", "content": build_user_message(payload, context)}
+        ]
+
+    def learn(self, source: str, terms: Any) -> int:
+        """Adds the model's new name/term spellings, if the term really occurs in the source line."""
+        if not isinstance(terms, dict):
+            return 0
+
+        added = 0
+        lowered = source.lower()
+        for term, persian in terms.items():
+            if len(self.glossary) >= GLOSSARY_MAX_TERMS:
+                break
+            if not isinstance(term, str) or not isinstance(persian, str):
+                continue
+            term, persian = term.strip(), persian.strip()
+            key = term.lower()
+            if not term or not persian or key in self._known:
+                continue
+            if len(term) > GLOSSARY_MAX_TERM_CHARS or len(persian) > GLOSSARY_MAX_TERM_CHARS:
+                continue
+            if key not in lowered or LATIN_PATTERN.search(persian) or "\n" in persian:
+                continue
+
+            self._known[key] = term
+            self.glossary[term] = persian
+            self._glossary_text += f"{term} = {persian}\n"
+            added += 1
+        return added
+
+
+def build_user_message(payload: List[Dict[str, Any]], context: Optional[List[Dict[str, Any]]] = None) -> str:
+    user_message = ""
+    if context is not None:
+        # درخواست ترمیم: فقط خطوط خراب، با خطوط همسایه برای حفظ معنی
+        user_message = f"{REPAIR_PREAMBLE}{json.dumps(context, ensure_ascii=False)}\n\n"
+    return user_message + f"{DATA_HEADER}{json.dumps(payload, ensure_ascii=False)}"
+
+
+_film_prompts: "OrderedDict[Tuple[str, str, str], FilmPrompt]" = OrderedDict()
+
+
+def film_prompt(title: str, genre: str, extra_context: Optional[str]) -> FilmPrompt:
+    """One FilmPrompt per (title, genre, context), shared by all chunks and later uploads of that film."""
+    key = (title, genre, extra_context or "")
+    prompt = _film_prompts.get(key)
+    if prompt is not None:
+        _film_prompts.move_to_end(key)
+        return prompt
+
+    prompt = _film_prompts[key] = FilmPrompt(title, genre, extra_context)
+    while len(_film_prompts) > MAX_FILM_PROMPTS:
+        _film_prompts.popitem(last=False)
+    return prompt
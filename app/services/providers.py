@@ -0,0 +1,449 @@
+import time
+import math
+import random
+import asyncio
+import importlib
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Set, Mapping, Type, cast
+import httpx
+from app.utils.config import env_str, env_int, env_float, env_bool
+from app.utils.logger import setup_logger
+from app.utils.chunker import PERSIAN_CHARS_PER_TOKEN
+from app.utils.metrics import (
+    LLM_REQUEST_SECONDS, LLM_ERRORS, LLM_TOKENS, LLM_TOKENS_ESTIMATED, DISPATCHER_WAIT_SECONDS, record_span
+)
+from app.services.dispatcher import AdaptiveDispatcher, LLM_MAX_RPM, LLM_MAX_TPM, LLM_INITIAL_CONCURRENCY, \
+    LLM_MAX_CONCURRENCY
+from app.services.http_transport import llm_http, LLM_TOTAL_TIMEOUT
+from app.services.retry import (
+    CircuitBreaker, CircuitOpenError, classify_error, retry_after_seconds,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS, RATE_LIMIT, SERVER, TIMEOUT, CONNECTION
+)
+
+logger = setup_logger("llm-providers")
+
+# نام providerها به ترتیب اولویت؛ اولی مدل اصلی (کلید حافظه ترجمه) است
+LLM_PROVIDERS = env_str("LLM_PROVIDERS", "github")
+
+# پیش‌فرض‌های هر provider؛ همه با {NAME}_KIND/_API_KEY/_BASE_URL/_MODEL/_WEIGHT/_RPM/_TPM قابل تغییرند
+PROVIDER_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "github": {
+        "kind": "openai",
+        "api_key_env": "GITHUB_API_KEY",
+        "base_url": "https://models.github.ai/inference",
+        "model": "openai/gpt-5-nano",
+    },
+    "groq": {
+        "kind": "groq",
+        "api_key_env": "GROQ_AI_API_KEY",
+        "model": "meta-llama/llama-4-maverick-17b-128e-instruct",
+    },
+    "gemini": {
+        "kind": "gemini",
+        "api_key_env": "GEMINI_API_KEY",
+        "model": "gemini-2.0-flash",
+    },
+}
+
+# خطاهایی که با رفتن سراغ provider دیگر حل می‌شوند
+FAILOVER_KINDS = {RATE_LIMIT, SERVER, TIMEOUT, CONNECTION}
+
+# (متن جدید، finish_reason)
+StreamDelta = Tuple[str, Optional[str]]
+# توکن‌های گزارش‌شده توسط provider: input (کل پرامپت)، cached_input (بخش کش‌شده‌اش)، output
+Usage = Dict[str, int]
+
+
+class LLMProvider:
+    """
+    One configured backend with its own rate budget, AIMD dispatcher and circuit breaker.
+    The SDK (`sdk_module`) is imported and the client built on first use, not at startup.
+    """
+    sdk_module = ""
+    requires_base_url = False
+
+    def __init__(
+            self,
+            name: str,
+            model: str,
+            weight: float,
+            rpm: int,
+            tpm: int,
+            api_key: str,
+            base_url: Optional[str] = None
+    ):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client: Any = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.dispatcher = AdaptiveDispatcher(
+            rpm=rpm,
+            tpm=tpm,
+            initial_concurrency=LLM_INITIAL_CONCURRENCY,
+            max_concurrency=LLM_MAX_CONCURRENCY
+        )
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS)
+        # سهم باقی‌مانده بودجه طبق هدرهای x-ratelimit-*؛ None یعنی نامعلوم
+        self.remaining_fraction: Optional[float] = None
+        self.remaining_until = 0.0
+
+    @property
+    def client(self) -> Any:
+        # SDK روی pool مشترک ساخته می‌شود؛ اگر lifespan pool را بسته و دوباره ساخته، client هم نو می‌شود
+        http_client = llm_http.client()
+        if self._client is None or self._http_client is not http_client:
+            self._client = self.make_client(http_client)
+            self._http_client = http_client
+        return self._client
+
+    def make_client(self, http_client: httpx.AsyncClient) -> Any:
+        raise NotImplementedError
+
+    def stream_chat(
+            self,
+            messages: List[Dict[str, str]],
+            max_tokens: int,
+            temperature: float,
+            usage: Usage
+    ) -> AsyncIterator[StreamDelta]:
+        """Streams deltas and fills `usage` if the backend reports token counts."""
+        raise NotImplementedError
+
+    def budget_factor(self) -> float:
+        if self.remaining_fraction is None or time.monotonic() > self.remaining_until:
+            return 1.0
+        return max(0.05, self.remaining_fraction)
+
+    def update_budget(self, headers: Mapping[str, str]) -> None:
+        try:
+            remaining = int(headers["x-ratelimit-remaining-requests"])
+            limit = int(headers["x-ratelimit-limit-requests"])
+        except (KeyError, ValueError):
+            return
+        self.remaining_fraction = remaining / limit if limit else None
+        self.remaining_until = time.monotonic() + 60
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "weight": self.weight,
+            "circuit": self.breaker.state,
+            "budget_factor": round(self.budget_factor(), 3),
+            "dispatcher": self.dispatcher.stats()
+        }
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    sdk_module = "openai"
+    requires_base_url = True
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # سرورهایی که stream_options را نمی‌پذیرند با {NAME}_STREAM_USAGE=false خاموش می‌شوند
+        self.stream_usage = env_bool(f"{self.name.upper()}_STREAM_USAGE", True)
+
+    def make_client(self, http_client: httpx.AsyncClient) -> Any:
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url, max_retries=0,
+            http_client=http_client, timeout=llm_http.timeout
+        )
+
+    async def stream_chat(self, messages, max_tokens, temperature, usage):
+        extra: Dict[str, Any] = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        raw = await self.client.chat.completions.with_raw_response.create(
+            messages=cast(Any, messages),
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **extra
+        )
+        self.update_budget(raw.headers)
+
+        stream = raw.parse()
+        try:
+            async for event in stream:
+                # usage در آخرین event می‌آید (Groq آن را در x_groq می‌گذارد)
+                reported = getattr(event, "usage", None) or getattr(getattr(event, "x_groq", None), "usage", None)
+                if reported:
+                    _openai_usage(reported, usage)
+                if not event.choices:
+                    continue
+                choice = event.choices[0]
+                yield (choice.delta.content or "") if choice.delta else "", choice.finish_reason
+        finally:
+            # پاسخ نیمه‌کاره (لغو، timeout) هم بسته می‌شود تا اتصال به pool برگردد
+            await stream.close()
+
+
+class GroqProvider(OpenAICompatibleProvider):
+    sdk_module = "groq"
+    requires_base_url = False
+
+    def make_client(self, http_client: httpx.AsyncClient) -> Any:
+        from groq import AsyncGroq
+        return AsyncGroq(
+            api_key=self.api_key, base_url=self.base_url, max_retries=0,
+            http_client=http_client, timeout=llm_http.timeout
+        )
+
+
+class GeminiProvider(LLMProvider):
+    FINISH_REASONS = {"STOP": "stop", "MAX_TOKENS": "length"}
+    sdk_module = "google.genai"
+
+    def make_client(self, http_client: httpx.AsyncClient) -> Any:
+        from google import genai
+        from google.genai import types
+        self._types = types
+        # google-genai transport خودش را دارد؛ فقط سقف زمان کل (میلی‌ثانیه) به آن داده می‌شود
+        return genai.Client(
+            api_key=self.api_key, http_options=types.HttpOptions(timeout=int(LLM_TOTAL_TIMEOUT * 1000))
+        )
+
+    async def stream_chat(self, messages, max_tokens, temperature, usage):
+        client = self.client
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        contents = "\n\n".join(m["content"] for m in messages if m["role"] != "system")
+        config = self._types.GenerateContentConfig(
+            system_instruction=system or None,
+            temperature=temperature,
+            max_output_tokens=max_tokens
+        )
+
+        stream = await client.aio.models.generate_content_stream(
+            model=self.model, contents=contents, config=config
+        )
+        async for chunk in stream:
+            if chunk.usage_metadata:
+                # مقادیر تجمعی‌اند؛ آخرین chunk عدد نهایی را دارد
+                metadata = chunk.usage_metadata
+                usage["input"] = metadata.prompt_token_count or 0
+                usage["cached_input"] = metadata.cached_content_token_count or 0
+                usage["output"] = metadata.candidates_token_count or 0
+            finish_reason = None
+            if chunk.candidates and chunk.candidates[0].finish_reason:
+                reason = chunk.candidates[0].finish_reason
+                finish_reason = self.FINISH_REASONS.get(getattr(reason, "name", str(reason)), "stop")
+            yield chunk.text or "", finish_reason
+
+
+class ProviderRouter:
+    """
+    Spreads calls over providers by weight × remaining rate-limit budget and fails over
+    to the next provider on 429/5xx/timeouts, as long as nothing was streamed yet.
+    """
+
+    def __init__(self, providers: List[LLMProvider]):
+        self.providers = providers
+
+    @property
+    def primary_model(self) -> str:
+        return self.providers[0].model if self.providers else "unconfigured"
+
+    @property
+    def models(self) -> List[str]:
+        return [p.model for p in self.providers]
+
+    def is_unavailable(self) -> bool:
+        return bool(self.providers) and all(p.breaker.is_open() for p in self.providers)
+
+    def retry_in(self) -> float:
+        return min((p.breaker.retry_in() for p in self.providers), default=0.0)
+
+    def pick(self, exclude: Set[str]) -> Optional[LLMProvider]:
+        candidates = [p for p in self.providers if p.name not in exclude and not p.breaker.is_open()]
+        if not candidates:
+            return None
+
+        # وزن × بودجه باقی‌مانده، تقسیم بر اشغال فعلی
+        scores = [
+            p.weight * p.budget_factor() / (1 + p.dispatcher.active / p.dispatcher.limit)
+            for p in candidates
+        ]
+        return random.choices(candidates, weights=scores, k=1)[0]
+
+    async def stream_chat(
+            self,
+            messages: List[Dict[str, str]],
+            estimated_tokens: int,
+            max_tokens: int,
+            temperature: float
+    ) -> AsyncIterator[StreamDelta]:
+        if not self.providers:
+            raise RuntimeError("No LLM provider configured (check LLM_PROVIDERS and API keys)")
+
+        tried: Set[str] = set()
+        last_error: Optional[BaseException] = None
+
+        while True:
+            provider = self.pick(tried)
+            if provider is None:
+                if last_error is not None:
+                    raise last_error
+                raise CircuitOpenError(self.retry_in())
+            tried.add(provider.name)
+
+            streamed = False
+            queued = time.perf_counter()
+            call_started: Optional[float] = None
+            output_chars = 0
+            usage: Usage = {}
+            # اگر فراخواننده استریم را نیمه‌کاره ببندد همین می‌ماند
+            outcome = "cancelled"
+            probe = False
+            try:
+                probe = provider.breaker.before_call()
+                async with provider.dispatcher.slot(estimated_tokens):
+                    call_started = time.perf_counter()
+                    DISPATCHER_WAIT_SECONDS.labels(provider=provider.name).observe(call_started - queued)
+                    # read timeout فاصله بین تکه‌ها را محدود می‌کند، این سقف کل استریم را
+                    deadline = call_started + LLM_TOTAL_TIMEOUT
+                    stream = provider.stream_chat(messages, max_tokens, temperature, usage)
+                    try:
+                        async for delta in stream:
+                            if time.perf_counter() > deadline:
+                                raise asyncio.TimeoutError(f"LLM call exceeded {LLM_TOTAL_TIMEOUT:.0f}s")
+                            streamed = True
+                            output_chars += len(delta[0])
+                            yield delta
+                    finally:
+                        await cast(Any, stream).aclose()
+
+                provider.dispatcher.record_success()
+                provider.breaker.record_success()
+                outcome = "success"
+                return
+
+            except CircuitOpenError:
+                continue
+
+            except Exception as e:
+                kind = classify_error(e)
+                outcome = kind
+                LLM_ERRORS.labels(provider=provider.name, kind=kind).inc()
+                provider.breaker.record_failure(kind, retry_after_seconds(e))
+                if kind == RATE_LIMIT:
+                    provider.dispatcher.record_rate_limit()
+
+                # بعد از شروع استریم، فراخواننده با خطوط باقی‌مانده دوباره تلاش می‌کند
+                if streamed or kind not in FAILOVER_KINDS:
+                    raise
+                logger.warning(f"Provider {provider.name} failed ({kind}), failing over")
+                last_error = e
+
+            except BaseException:
+                # لغو (قطع SSE، توقف job) نه موفقیت است نه خطا؛ probe نیمه‌باز آزاد می‌شود
+                if probe:
+                    provider.breaker.release_probe()
+                raise
+
+            finally:
+                if call_started is not None:
+                    _record_call(provider.name, messages, queued, call_started, output_chars, usage, outcome)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [p.stats() for p in self.providers]
+
+    async def preload_sdks(self) -> None:
+        """Imports the configured SDKs in a worker thread, so the first chunk doesn't block the loop on it."""
+        modules = sorted({p.sdk_module for p in self.providers if p.sdk_module})
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(lambda: [importlib.import_module(module) for module in modules])
+        except ImportError as e:
+            logger.error(f"Provider SDK preload failed: {e}")
+            return
+        if modules:
+            logger.info(f"Loaded {', '.join(modules)} in {time.perf_counter() - started:.2f}s")
+
+
+def _openai_usage(reported: Any, usage: Usage) -> None:
+    usage["input"] = getattr(reported, "prompt_tokens", 0) or 0
+    usage["output"] = getattr(reported, "completion_tokens", 0) or 0
+    details = getattr(reported, "prompt_tokens_details", None)
+    usage["cached_input"] = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+
+def _record_call(
+        provider: str,
+        messages: List[Dict[str, str]],
+        queued: float,
+        started: float,
+        output_chars: int,
+        usage: Usage,
+        outcome: str
+) -> None:
+    elapsed = time.perf_counter() - started
+    LLM_REQUEST_SECONDS.labels(provider=provider, outcome=outcome).observe(elapsed)
+
+    tokens: Dict[str, Any] = {}
+    if usage:
+        tokens = {"input_tokens": usage["input"], "cached_tokens": usage["cached_input"], "output_tokens": usage["output"]}
+        LLM_TOKENS.labels(provider=provider, direction="input").inc(usage["input"])
+        LLM_TOKENS.labels(provider=provider, direction="cached_input").inc(usage["cached_input"])
+        LLM_TOKENS.labels(provider=provider, direction="output").inc(usage["output"])
+    elif outcome == "success" or output_chars:
+        # provider عدد نداده؛ تخمین با همان نسبت‌های chunker و translate_chunk (درخواست ردشده توکنی مصرف نکرده)
+        LLM_TOKENS_ESTIMATED.labels(provider=provider, direction="input").inc(
+            math.ceil(sum(len(m["content"]) for m in messages) / 3.8)
+        )
+        LLM_TOKENS_ESTIMATED.labels(provider=provider, direction="output").inc(
+            math.ceil(output_chars / PERSIAN_CHARS_PER_TOKEN)
+        )
+
+    record_span(
+        "llm_call", started, elapsed,
+        provider=provider, outcome=outcome, wait_ms=round((started - queued) * 1000, 2), **tokens
+    )
+
+
+# {NAME}_KIND -> کلاس provider؛ ثبت یک نوع، SDK آن را import نمی‌کند
+PROVIDER_KINDS: Dict[str, Type[LLMProvider]] = {
+    "openai": OpenAICompatibleProvider,
+    "groq": GroqProvider,
+    "gemini": GeminiProvider,
+}
+
+
+def _build_provider(name: str) -> Optional[LLMProvider]:
+    defaults = PROVIDER_DEFAULTS.get(name, {"kind": "openai", "api_key_env": f"{name.upper()}_API_KEY"})
+    prefix = name.upper()
+
+    kind = env_str(f"{prefix}_KIND", defaults["kind"])
+    api_key = env_str(f"{prefix}_API_KEY") or env_str(defaults["api_key_env"])
+    base_url = env_str(f"{prefix}_BASE_URL", defaults.get("base_url"))
+    model = env_str(f"{prefix}_MODEL", defaults.get("model"))
+    weight = env_float(f"{prefix}_WEIGHT", 1.0)
+    rpm = env_int(f"{prefix}_RPM", LLM_MAX_RPM)
+    tpm = env_int(f"{prefix}_TPM", LLM_MAX_TPM)
+
+    if not api_key:
+        logger.warning(f"Provider {name} skipped: no API key")
+        return None
+    if not model:
+        logger.warning(f"Provider {name} skipped: no model configured")
+        return None
+
+    provider_class = PROVIDER_KINDS.get(kind)
+    if provider_class is None:
+        logger.warning(f"Provider {name} skipped: unknown kind {kind}")
+        return None
+    if provider_class.requires_base_url and not base_url:
+        logger.warning(f"Provider {name} skipped: no base URL")
+        return None
+    return provider_class(name, model, weight, rpm, tpm, api_key, base_url)
+
+
+def build_router_from_env() -> ProviderRouter:
+    names = [n.strip().lower() for n in LLM_PROVIDERS.split(",") if n.strip()]
+    providers = [p for p in (_build_provider(n) for n in names) if p]
+    logger.info(f"LLM providers: {', '.join(f'{p.name}({p.model})' for p in providers) or 'none'}")
+    return ProviderRouter(providers)
+
+
+provider_router = build_router_from_env()
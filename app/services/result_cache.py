@@ -0,0 +1,93 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Tuple, Callable, Awaitable, Optional
+from app.utils.config import env_int
+from app.utils.logger import setup_logger
+from app.utils.metrics import RESULT_CACHE_REQUESTS
+
+logger = setup_logger("result-cache")
+
+RESULT_CACHE_SIZE = env_int("RESULT_CACHE_SIZE", 256)
+RESULT_CACHE_TTL_SECONDS = env_int("RESULT_CACHE_TTL_SECONDS", 3600)
+
+
+class TranslationResultCache:
+    """
+    Singleflight plus a TTL/LRU cache for /translate results, keyed by the decoded-content fingerprint.
+    Concurrent identical uploads share one pipeline run; finished results are reused until they expire.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # کلید -> (زمان انقضا، امضای فایل SRT، نتیجه)؛ ترتیب دیکشنری همان ترتیب LRU است
+        self._results: "OrderedDict[str, Tuple[float, Tuple[int, int], Dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_run(self, key: str, run: Callable[[], Awaitable[Dict]]) -> Tuple[Dict, str]:
+        """Returns (result, "hit" | "coalesced" | "miss")."""
+        cached = self._lookup(key)
+        if cached is not None:
+            RESULT_CACHE_REQUESTS.labels(outcome="hit").inc()
+            return cached, "hit"
+
+        task = self._inflight.get(key)
+        status = "coalesced"
+        if task is None:
+            status = "miss"
+            task = self._inflight[key] = asyncio.create_task(run())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            logger.info(f"Joining in-flight translation {key[:12]}")
+        RESULT_CACHE_REQUESTS.labels(outcome=status).inc()
+
+        # shield: قطع شدن یک درخواست، اجرای مشترک را برای بقیه لغو نمی‌کند
+        return await asyncio.shield(task), status
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._results), "inflight": len(self._inflight)}
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+
+        expires_at, signature, result = entry
+        # هر اجرا فایل SRT خودش را دارد؛ اگر پاک یا عوض شده، نتیجه به درد download نمی‌خورد
+        if expires_at < time.monotonic() or _file_signature(result["file_info"]["path"]) != signature:
+            del self._results[key]
+            return None
+
+        self._results.move_to_end(key)
+        return result
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        result = task.result()
+        # ترجمه ناقص (خطوط fallback) کش نمی‌شود تا ارسال دوباره فرصت تکمیل داشته باشد
+        if result.get("memory", {}).get("fallbacks"):
+            return
+
+        signature = _file_signature(result["file_info"]["path"])
+        if signature is None:
+            return
+        self._results[key] = (time.monotonic() + self.ttl_seconds, signature, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+result_cache = TranslationResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
@@ -0,0 +1,215 @@
+import re
+import sys
+import time
+import asyncio
+import random
+import json
+from email.utils import parsedate_to_datetime
+from typing import Optional, Mapping
+import httpx
+from app.utils.config import env_int, env_float
+from app.utils.logger import setup_logger
+
+logger = setup_logger("llm-retry")
+
+RETRY_MAX_ATTEMPTS = env_int("RETRY_MAX_ATTEMPTS", 5)
+RETRY_BASE_DELAY = env_float("RETRY_BASE_DELAY", 2.0)
+RETRY_MAX_DELAY = env_float("RETRY_MAX_DELAY", 120.0)
+CIRCUIT_FAILURE_THRESHOLD = env_int("CIRCUIT_FAILURE_THRESHOLD", 5)
+CIRCUIT_COOLDOWN_SECONDS = env_float("CIRCUIT_COOLDOWN_SECONDS", 30.0)
+
+# انواع خطا
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+CLIENT = "client"
+INVALID_RESPONSE = "invalid_response"
+UNKNOWN = "unknown"
+
+# خطای client (کلید نامعتبر، درخواست خراب) با تکرار درست نمی‌شود
+RETRYABLE = {RATE_LIMIT, SERVER, TIMEOUT, CONNECTION, INVALID_RESPONSE, UNKNOWN}
+# خطاهایی که نشان می‌دهند provider در دسترس نیست و مدار را باز می‌کنند.
+# 429 عادی است و فقط dispatcher (AIMD) و Retry-After آن را کنترل می‌کنند، نه مدار
+TRIPPING = {SERVER, TIMEOUT, CONNECTION}
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_in: float):
+        super().__init__(f"LLM provider circuit is open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # openai/groq: status_code، google-genai: code
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def classify_error(exc: BaseException) -> str:
+    # SDKهای groq و openai خطای httpx را به‌عنوان __cause__ نگه می‌دارند.
+    # ترتیب مهم است: APITimeoutError زیرکلاس APIConnectionError است
+    cause = exc.__cause__
+    # SDK openai فقط وقتی load شده باشد خطایش ممکن است؛ این‌جا import نمی‌شود تا شروع برنامه سبک بماند
+    openai = sys.modules.get("openai")
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)) or isinstance(cause, httpx.TimeoutException) \
+            or (openai is not None and isinstance(exc, openai.APITimeoutError)):
+        return TIMEOUT
+    if isinstance(exc, httpx.TransportError) or isinstance(cause, httpx.TransportError) \
+            or (openai is not None and isinstance(exc, openai.APIConnectionError)):
+        return CONNECTION
+
+    status = _status_code(exc)
+    if status is not None:
+        if status == 429:
+            return RATE_LIMIT
+        if status >= 500 or status in (408, 409):
+            return SERVER
+        return CLIENT
+
+    if isinstance(exc, (ValueError, json.JSONDecodeError)):
+        return INVALID_RESPONSE
+    return UNKNOWN
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """'1.5', '20ms', '6m0s' -> seconds"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After or x-ratelimit-* headers."""
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+
+    if "retry-after" in headers:
+        value = headers["retry-after"]
+        seconds = _parse_duration(value)
+        if seconds is None:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            return max(0.0, seconds)
+
+    # OpenAI/Groq: فقط بودجه‌ای که تمام شده مهم است
+    waits = []
+    for kind in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+            if reset is not None:
+                waits.append(reset)
+    return max(waits) if waits else None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is None:
+        return None
+    return retry_after_from_headers(headers)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter; a provider-supplied Retry-After takes precedence."""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, kind: str, attempt: int) -> bool:
+        return kind in RETRYABLE and attempt < self.max_attempts
+
+    def delay(self, attempt: int, kind: str, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            # کمی jitter تا درخواست‌های هم‌زمان دقیقاً با هم برنگردند
+            return min(self.max_delay, retry_after + random.uniform(0, min(1.0, retry_after * 0.1 + 0.1)))
+
+        base = self.base_delay * (4 if kind == RATE_LIMIT else 1)
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive provider failures; while open every
+    call fails fast. After the cooldown one probe call is let through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        if self.state == "half_open" and self._probe_in_flight:
+            return self.cooldown_seconds
+        return max(0.0, self.opened_until - time.monotonic())
+
+    def is_open(self) -> bool:
+        # نیمه‌باز با probe در جریان هم برای بقیه فراخوانی‌ها بسته است
+        if self.state == "half_open":
+            return self._probe_in_flight
+        return self.state == "open" and self.retry_in() > 0
+
+    def before_call(self) -> bool:
+        """Raises CircuitOpenError while open; True when this call is the half-open probe."""
+        if self.state == "closed":
+            return False
+        if self.state == "open":
+            if self.retry_in() > 0:
+                raise CircuitOpenError(self.retry_in())
+            self.state = "half_open"
+        if self._probe_in_flight:
+            raise CircuitOpenError(self.cooldown_seconds)
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("Circuit closed, provider recovered")
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """The call ended without an outcome (cancelled); the next call may probe again."""
+        self._probe_in_flight = False
+
+    def record_failure(self, kind: str, retry_after: Optional[float] = None) -> None:
+        if kind not in TRIPPING:
+            self._probe_in_flight = False
+            return
+
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            cooldown = max(self.cooldown_seconds, retry_after or 0.0)
+            self.opened_until = time.monotonic() + cooldown
+            if self.state != "open":
+                logger.warning(f"Circuit opened after {self.failures} failures ({kind}), cooling down {cooldown:.0f}s")
+            self.state = "open"
+        self._probe_in_flight = False
+
+
+retry_policy = RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
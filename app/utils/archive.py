@@ -0,0 +1,42 @@
+import io
+import os
+import zipfile
+from typing import List, Tuple
+
+
+def read_srt_archive(content: bytes, max_total_size: int) -> List[Tuple[str, bytes]]:
+    """Returns (filename, bytes) for every .srt inside a zip, checking the uncompressed size first."""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise ValueError("Invalid zip archive")
+
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(".srt")
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        # حجم واقعی قبل از باز کردن بررسی می‌شود (zip bomb)
+        if sum(info.file_size for info in entries) > max_total_size:
+            raise ValueError("Archive content too large")
+
+        entries.sort(key=lambda info: info.filename)
+        return [(os.path.basename(info.filename), archive.read(info)) for info in entries]
+
+
+def build_zip(files: List[Tuple[str, bytes]]) -> bytes:
+    buffer = io.BytesIO()
+    used = set()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            # نام تکراری (مثلاً از پوشه‌های مختلف zip) بازنویسی نشود
+            stem, ext = os.path.splitext(name)
+            unique, n = name, 1
+            while unique in used:
+                n += 1
+                unique = f"{stem}-{n}{ext}"
+            used.add(unique)
+            archive.writestr(unique, data)
+    return buffer.getvalue()
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+from typing import List, Dict, Any
+from app.utils.config import env_int
+from app.utils.storage import STORAGE_DIR
+from app.utils.logger import setup_logger
+
+logger = setup_logger("srt-checkpoint")
+
+CHECKPOINT_DIR = os.path.join(STORAGE_DIR, "checkpoints")
+# چک‌پوینت اجرایی که با fallback تمام شده یا کرش کرده بعد از این مدت پاک می‌شود؛ صفر یعنی بدون محدودیت
+CHECKPOINT_RETENTION_HOURS = env_int("CHECKPOINT_RETENTION_HOURS", 72)
+
+
+class TranslationCheckpoint:
+    """
+    Append-only JSONL log of finished chunks for one (file, params) fingerprint.
+    Each line is one chunk, so a crash can lose at most the chunk being written.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.path = os.path.join(CHECKPOINT_DIR, f"{key}.jsonl")
+
+    def load(self) -> Dict[int, str]:
+        done: Dict[int, str] = {}
+        if not os.path.exists(self.path):
+            return done
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                try:
+                    for item in json.loads(line)["items"]:
+                        done[int(item["index"])] = item["translated"]
+                except (ValueError, KeyError, TypeError):
+                    # خط آخر ممکن است هنگام کرش نیمه‌کاره نوشته شده باشد
+                    logger.warning(f"Ignoring corrupt checkpoint line {line_no} in {self.key}")
+        return done
+
+    def append(self, items: List[Dict[str, Any]]) -> None:
+        items = [
+            {"index": item["index"], "translated": item["translated"]}
+            for item in items
+            if not item.get("fallback")
+        ]
+        if not items:
+            return
+
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"items": items}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def evict_checkpoints(retention_hours: int = CHECKPOINT_RETENTION_HOURS) -> int:
+    """Deletes checkpoints not appended to for `retention_hours`."""
+    if retention_hours <= 0:
+        return 0
+    try:
+        names = os.listdir(CHECKPOINT_DIR)
+    except FileNotFoundError:
+        return 0
+
+    cutoff = time.time() - retention_hours * 3600
+    removed = 0
+    for name in names:
+        path = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Evicted {removed} stale checkpoints")
+    return removed
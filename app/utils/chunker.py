@@ -0,0 +1,114 @@
+import math
+import json
+from typing import List, Dict, Tuple, Any
+from app.utils.config import env_int, env_float
+from app.utils.parser import Cue
+from app.utils.logger import setup_logger
+
+logger = setup_logger("srt-chunker")
+
+# (حداکثر توکن ورودی، حداکثر توکن خروجی) هر درخواست برای هر مدل
+MODEL_TOKEN_LIMITS: Dict[str, Tuple[int, int]] = {
+    "openai/gpt-5-nano": (8000, 4096),
+    "openai/gpt-4o-mini": (8000, 4096),
+    "meta-llama/llama-4-maverick-17b-128e-instruct": (8000, 4096),
+    "gemini-2.0-flash": (30000, 8192),
+}
+DEFAULT_TOKEN_LIMITS = (8000, 4096)
+
+# توکن‌های رزرو شده برای system prompt وقتی پیشوند واقعی فیلم در دست نیست (FilmPrompt.reserved_tokens)
+PROMPT_OVERHEAD_TOKENS = env_int("CHUNK_PROMPT_OVERHEAD_TOKENS", 1200)
+# فقط این بخش از سقف خروجی پر می‌شود تا JSON هیچ‌وقت بریده نشود
+OUTPUT_SAFETY_RATIO = env_float("CHUNK_OUTPUT_SAFETY_RATIO", 0.75)
+# فاصله زمانی که مرز صحنه حساب می‌شود
+SCENE_GAP_MS = env_int("CHUNK_SCENE_GAP_MS", 3000)
+# اگر چانک دست‌کم این مقدار پر شده باشد، روی آخرین مرز صحنه بریده می‌شود
+SCENE_CUT_MIN_FILL = env_float("CHUNK_SCENE_CUT_MIN_FILL", 0.6)
+
+# فارسی از انگلیسی بلندتر است و توکنایزرها برای آن کاراکتر کمتری در هر توکن دارند
+PERSIAN_EXPANSION = 1.2
+PERSIAN_CHARS_PER_TOKEN = 2.2
+OUTPUT_ITEM_OVERHEAD_CHARS = 30  # {"index": "123", "translated": ""},
+# انگلیسی و JSON
+CHARS_PER_TOKEN = 3.8
+
+
+def estimate_json_tokens(obj: Any) -> int:
+    """
+    Estimates tokens for the entire JSON structure.
+    Gemini uses about 1 token per 4 characters for English/JSON.
+    """
+    json_string = json.dumps(obj)
+    # Average: 4 chars per token + safety margin
+    return math.ceil(len(json_string) / CHARS_PER_TOKEN)
+
+
+def estimate_output_tokens(text: str) -> int:
+    return math.ceil((len(text) * PERSIAN_EXPANSION + OUTPUT_ITEM_OVERHEAD_CHARS) / PERSIAN_CHARS_PER_TOKEN)
+
+
+def chunk_budget(models: List[str], overhead_tokens: int = PROMPT_OVERHEAD_TOKENS) -> Tuple[int, int]:
+    # چانک باید در تنگ‌ترین مدل هم جا شود، چون router هر چانک را به هر providerی ممکن است بدهد
+    limits = [MODEL_TOKEN_LIMITS.get(model, DEFAULT_TOKEN_LIMITS) for model in models] or [DEFAULT_TOKEN_LIMITS]
+    max_input = min(limit[0] for limit in limits)
+    max_output = min(limit[1] for limit in limits)
+    return max_input - overhead_tokens, int(max_output * OUTPUT_SAFETY_RATIO)
+
+
+def pack_chunks(
+        blocks: List[Cue],
+        models: List[str],
+        max_items: int,
+        overhead_tokens: int = PROMPT_OVERHEAD_TOKENS
+) -> List[List[Cue]]:
+    """
+    Greedily fills each chunk up to the tightest model's input/output token budget (and max_items),
+    after `overhead_tokens` for the prompt prefix. When a chunk is full it is cut at its last scene
+    gap if that keeps it reasonably full. Empty cues are skipped.
+    """
+    max_input, max_output = chunk_budget(models, overhead_tokens)
+
+    chunks: List[List[Cue]] = []
+    # هر آیتم: (block, توکن ورودی, توکن خروجی, آیا قبلش مرز صحنه است)
+    current: List[Tuple[Cue, int, int, bool]] = []
+    previous_end = None
+
+    def totals(items) -> Tuple[int, int]:
+        return sum(i[1] for i in items), sum(i[2] for i in items)
+
+    def fill(items) -> float:
+        in_tok, out_tok = totals(items)
+        return max(in_tok / max_input, out_tok / max_output)
+
+    for block in blocks:
+        text = block.clean
+        if not text.strip():
+            continue
+
+        in_tok = estimate_json_tokens({"index": block.index, "original": text})
+        out_tok = estimate_output_tokens(text)
+        scene_break = previous_end is not None and block.start_ms - previous_end >= SCENE_GAP_MS
+        previous_end = block.end_ms
+
+        while current:
+            cur_in, cur_out = totals(current)
+            if cur_in + in_tok <= max_input and cur_out + out_tok <= max_output and len(current) < max_items:
+                break
+
+            cut = next((i for i in range(len(current) - 1, 0, -1) if current[i][3]), None)
+            if cut is not None and fill(current[:cut]) >= SCENE_CUT_MIN_FILL:
+                chunks.append([item[0] for item in current[:cut]])
+                current = current[cut:]
+            else:
+                chunks.append([item[0] for item in current])
+                current = []
+
+        if in_tok > max_input or out_tok > max_output:
+            logger.warning(f"Cue #{block.index} alone exceeds the chunk token budget")
+
+        current.append((block, in_tok, out_tok, scene_break))
+
+    if current:
+        chunks.append([item[0] for item in current])
+
+    return chunks
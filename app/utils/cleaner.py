@@ -1,4 +1,6 @@
 import re
+from typing import List
+from app.utils.parser import Cue
 from app.utils.logger import setup_logger
 
 logger = setup_logger("srt-cleaner")
@@ -10,34 +12,73 @@ PATTERNS = {
     "noise": re.compile(r"[♪♫].*?[♪♫]|[\[\(].*?[\]\)]|^[A-Z][A-Z0-9_ ]{1,20}:\s+|^[-–—]+\s*"),
     "stutter": re.compile(r"\b(\w+)--\s*\1\b|\b([A-Za-z])-\2([A-Za-z]+)", re.IGNORECASE),
     "space": re.compile(r"\s+"),
-    "sent_end": re.compile(r"[.!?]$")
+    # پایان جمله؛ "..." و "…" در انتهای cue یعنی جمله در cue بعدی ادامه دارد
+    "sent_end": re.compile(r"(?:[!?]|(?<!\.)\.)[\"'”’)\]]*$")
 }
 
 CONTRACTIONS = {"I'm": "I am", "you're": "you are", "it's": "it is", "don't": "do not", "gonna": "going to",
                 "wanna": "want to"}
 
-def clean_subtitle_text(text: str) -> str:
-    text = PATTERNS["control"].sub("", text)
-    text = PATTERNS["html"].sub("", text)
-    text = PATTERNS["noise"].sub("", text)
-    text = PATTERNS["stutter"].sub(r"\1\2\3", text)
+# همه contractionها در یک الگوی کامپایل‌شده؛ گروه مطابق، جایگزین را از جدول انتخاب می‌کند.
+# lookahead حرف اول به موتور regex اجازه می‌دهد موقعیت‌های بی‌ربط را سریع رد کند
+CONTRACTION_PATTERN = re.compile(
+    "(?=[" + "".join(sorted({k[0].lower() for k in CONTRACTIONS})) + r"])\b(?:"
+    + "|".join(f"({re.escape(k)})" for k in CONTRACTIONS) + r")\b",
+    re.IGNORECASE
+)
+CONTRACTION_VALUES = (None, *CONTRACTIONS.values())
+DASHES = ("-", "–", "—")
+# جداکننده متن‌ها در بافر مشترک clean_subtitle_texts
+BATCH_SEPARATOR = "\x00"
+
+
+def _expand_contraction(match: re.Match) -> str:
+    return CONTRACTION_VALUES[match.lastindex]
+
 
-    for k, v in CONTRACTIONS.items():
-        text = re.sub(rf"\b{k}\b", v, text, flags=re.IGNORECASE)
+def _clean_without_control(text: str) -> str:
+    # هر مرحله فقط وقتی اجرا می‌شود که کاراکتر لازم برای تطابقش در متن باشد
+    if "<" in text:
+        text = PATTERNS["html"].sub("", text)
+    if "[" in text or "(" in text or "♪" in text or "♫" in text or ":" in text or text.startswith(DASHES):
+        text = PATTERNS["noise"].sub("", text)
+    if "-" in text:
+        text = PATTERNS["stutter"].sub(r"\1\2\3", text)
+    # همه contractionها یا آپاستروف دارند یا nna (حروفی که در IGNORECASE فقط معادل ASCII دارند)
+    if "'" in text or "nna" in text.lower():
+        text = CONTRACTION_PATTERN.sub(_expand_contraction, text)
 
     if text.isupper(): text = text.capitalize()
-    return PATTERNS["space"].sub(" ", text).strip()
-
-def clean_subtitle_blocks(blocks: list[dict]) -> list[dict]:
-    output = []
-    for block in blocks:
-        new_block = block.copy()
-        # متن را تمیز می‌کنیم؛ اگر نویز بود، رشته خالی برمی‌گرداند
-        new_block["text"] = clean_subtitle_text(block["text"])
-        output.append(new_block)
-    return output
-
-def prepare_for_translation(blocks: list[dict]) -> list[dict]:
+    return " ".join(text.split())
+
+
+def clean_subtitle_text(text: str) -> str:
+    return _clean_without_control(PATTERNS["control"].sub("", text))
+
+
+def clean_subtitle_texts(texts: List[str]) -> List[str]:
+    """
+    Cleans a whole cue list in one call: control characters are found and removed in one
+    joined buffer (split back on a separator), the other passes skip texts that cannot match.
+    """
+    if not texts:
+        return []
+    joined = BATCH_SEPARATOR.join(texts)
+    if joined.count(BATCH_SEPARATOR) != len(texts) - 1:
+        # جداکننده داخل خود متن‌ها هم هست؛ تک‌تک پردازش می‌شوند
+        return [clean_subtitle_text(text) for text in texts]
+    if PATTERNS["control"].search(joined):
+        texts = PATTERNS["control"].sub("", joined).split(BATCH_SEPARATOR)
+    return [_clean_without_control(text) for text in texts]
+
+
+def clean_subtitle_blocks(blocks: List[Cue]) -> List[Cue]:
+    # متن تمیز کنار متن اصلی روی همان cue نوشته می‌شود؛ اگر نویز بود، رشته خالی
+    for block, clean in zip(blocks, clean_subtitle_texts([block.text for block in blocks])):
+        block.clean = clean
+    return blocks
+
+def prepare_for_translation(blocks: List[Cue]) -> List[Cue]:
     """
     نسخه اصلاح شده: فقط پاکسازی انجام می‌دهد و ردیف‌ها را ادغام نمی‌کند
     تا ساختار ایندکس‌ها برای مدل Fireworks دست‌نخورده باقی بماند.
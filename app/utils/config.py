@@ -0,0 +1,57 @@
+import os
+from typing import Optional
+
+_dotenv_loaded = False
+
+
+def _find_dotenv() -> Optional[str]:
+    # همان جستجوی python-dotenv (از پوشه این فایل به بالا)، بدون import کردن خود پکیج
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        candidate = os.path.join(directory, ".env")
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _ensure_dotenv() -> None:
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        _dotenv_loaded = True
+        path = _find_dotenv()
+        # python-dotenv فقط وقتی فایل .env وجود دارد import می‌شود
+        if path:
+            from dotenv import load_dotenv
+            load_dotenv(path)
+
+
+def env_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    _ensure_dotenv()
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def env_int(name: str, default: int) -> int:
+    value = env_str(name)
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        raise ValueError(f"Invalid integer for {name}: {value}")
+
+
+def env_float(name: str, default: float) -> float:
+    value = env_str(name)
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        raise ValueError(f"Invalid number for {name}: {value}")
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = env_str(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -1,4 +1,6 @@
-from typing import Optional
+import re
+import codecs
+from typing import Optional, Iterator
 from app.utils.logger import setup_logger
 
 logger = setup_logger("srt-decoder")
@@ -8,31 +10,106 @@ BOM_UTF16_LE = b"\xff\xfe"
 BOM_UTF16_BE = b"\xfe\xff"
 FALLBACK_ENCODINGS = ("windows-1256", "windows-1252", "iso-8859-1")
 
+# تشخیص encoding فقط روی همین مقدار از ابتدای فایل انجام می‌شود
+SAMPLE_SIZE = 64 * 1024
+DECODE_CHUNK_SIZE = 256 * 1024
+
+# بایت‌هایی که در cp1252 تعریف نشده‌اند ولی در cp1256 حروف فارسی‌اند (پ، چ، ژ، گ، ...)
+CP1252_UNDEFINED = b"\x81\x8d\x8f\x90\x9d"
+# نگاشت بایت‌های 0x80-0xFF به 1 و بقیه به 0، برای شمارش سریع با bytes.count
+HIGH_BYTE_MASK = bytes(1 if b >= 0x80 else 0 for b in range(256))
+# بایت‌هایی که در cp1256 حرف عربی/فارسی‌اند -> 1
+ARABIC_LETTER_MASK = bytes(
+    1 if b >= 0x80 and "\u0600" <= bytes([b]).decode("windows-1256") <= "\u06ff"
+    and bytes([b]).decode("windows-1256").isalpha() else 0
+    for b in range(256)
+)
+# کلمه عربی/فارسی در cp1256 تماماً بایت بالاست؛ حروف accent‌دار لاتین (Größe، süß) کنار حرف ASCII می‌آیند
+HIGH_BYTE_WORD = re.compile(rb"(?<![A-Za-z\x80-\xff])[\x80-\xff]{2,}(?![A-Za-z\x80-\xff])")
+# حداقل سهم بایت‌های بالا که حرف عربی در چنین کلمه‌ای‌اند
+ARABIC_LETTER_SHARE = 0.5
+
+
 def decode_subtitle_bytes(raw_bytes: bytes) -> str:
     if not raw_bytes:
         raise ValueError("File is empty")
 
-    encoding_hint = _detect_bom(raw_bytes)
-    if encoding_hint:
-        try:
-            return _normalize_text(raw_bytes.decode(encoding_hint))
-        except UnicodeDecodeError:
-            pass
+    detected = detect_encoding(raw_bytes)
+    candidates = [detected] + [enc for enc in ("utf-8",) + FALLBACK_ENCODINGS if enc != detected]
 
-    for enc in ("utf-8", "utf-16") + FALLBACK_ENCODINGS:
+    for enc in candidates:
         try:
-            return _normalize_text(raw_bytes.decode(enc))
+            return "".join(iter_decoded_chunks(raw_bytes, enc)).strip()
         except UnicodeDecodeError:
+            logger.warning(f"Decoding as {enc} failed past the sample, trying the next encoding")
             continue
 
     raise ValueError("Unable to decode subtitle file.")
 
+
+def detect_encoding(raw_bytes: bytes) -> str:
+    """Picks a codec from the BOM or from the first SAMPLE_SIZE bytes, without decoding the whole file."""
+    bom = _detect_bom(raw_bytes)
+    if bom:
+        return bom
+
+    sample = raw_bytes[:SAMPLE_SIZE]
+
+    # UTF-16 بدون BOM: نیمی از بایت‌های متن لاتین/اعداد صفر است
+    zeros_even = sample[0::2].count(0)
+    zeros_odd = sample[1::2].count(0)
+    if max(zeros_even, zeros_odd) > len(sample) // 8:
+        return "utf-16-be" if zeros_even > zeros_odd else "utf-16-le"
+
+    try:
+        # final=False: کاراکتر چندبایتی بریده شده در انتهای نمونه خطا حساب نمی‌شود
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    if any(b in sample for b in CP1252_UNDEFINED):
+        return "windows-1256"
+
+    high = sample.translate(HIGH_BYTE_MASK).count(1)
+    arabic = b"".join(HIGH_BYTE_WORD.findall(sample)).translate(ARABIC_LETTER_MASK).count(1)
+    return "windows-1256" if high and arabic / high >= ARABIC_LETTER_SHARE else "windows-1252"
+
+
+def iter_decoded_chunks(raw_bytes: bytes, encoding: str, chunk_size: int = DECODE_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Decodes incrementally and normalizes each piece in the same pass: CRLF/CR -> LF and
+    BOM/zero-width space removed. A trailing CR is held back in case its LF starts the next piece.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    view = memoryview(raw_bytes)
+    pending_cr = ""
+
+    for start in range(0, len(raw_bytes), chunk_size):
+        piece = pending_cr + decoder.decode(view[start:start + chunk_size])
+        pending_cr = ""
+        if piece.endswith("\r"):
+            piece, pending_cr = piece[:-1], "\r"
+        yield _normalize_text(piece)
+
+    tail = pending_cr + decoder.decode(b"", final=True)
+    if tail:
+        yield _normalize_text(tail)
+
+
 def _detect_bom(raw_bytes: bytes) -> Optional[str]:
     if raw_bytes.startswith(BOM_UTF8): return "utf-8-sig"
     if raw_bytes.startswith(BOM_UTF16_LE): return "utf-16-le"
     if raw_bytes.startswith(BOM_UTF16_BE): return "utf-16-be"
     return None
 
+
 def _normalize_text(text: str) -> str:
-    normalized = text.replace("\r\n", "\n").replace("\r", "\n")
-    return normalized.replace("\ufeff", "").replace("\u200b", "").strip()
\ No newline at end of file
+    # هر جایگزینی فقط وقتی اجرا می‌شود که کاراکترش در این تکه باشد
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if "\ufeff" in text:
+        text = text.replace("\ufeff", "")
+    if "\u200b" in text:
+        text = text.replace("\u200b", "")
+    return text
@@ -0,0 +1,11 @@
+import json
+import hashlib
+from typing import Dict, Any
+
+
+def content_fingerprint(content: bytes, params: Dict[str, Any]) -> str:
+    """sha256 over the uploaded bytes plus the (sorted) translation parameters."""
+    digest = hashlib.sha256(content)
+    digest.update(b"\x00")
+    digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
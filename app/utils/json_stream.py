@@ -0,0 +1,73 @@
+import re
+import json
+from typing import List, Dict, Tuple
+
+# فقط کاراکترهایی که ساختار JSON را تغییر می‌دهند
+STRUCTURAL = re.compile(r'["\\{}\[\]]')
+
+
+class JSONObjectStream:
+    """
+    Incremental scanner over a streamed completion.
+    feed() returns every JSON object carrying an "index" key as soon as its closing brace
+    arrives, whatever it is wrapped in (results array, bare list, markdown fence, prose).
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack: List[Tuple[str, int]] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        self._text += chunk
+        objects = []
+        text = self._text
+        pos = self._pos
+
+        while True:
+            if self._escape:
+                if pos >= len(text):
+                    break
+                self._escape = False
+                pos += 1
+                continue
+
+            match = STRUCTURAL.search(text, pos)
+            if not match:
+                pos = len(text)
+                break
+
+            ch = match.group()
+            pos = match.end()
+
+            if self._in_string:
+                if ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                # رشته‌های بیرون از JSON (متن آزاد مدل) نادیده گرفته می‌شوند
+                if self._stack:
+                    self._in_string = True
+            elif ch in "{[":
+                self._stack.append((ch, match.start()))
+            elif self._stack:
+                opener, start = self._stack.pop()
+                if ch == "}" and opener == "{":
+                    try:
+                        obj = json.loads(text[start:pos])
+                    except ValueError:
+                        continue
+                    if isinstance(obj, dict) and "index" in obj:
+                        objects.append(obj)
+
+        # وقتی هیچ ساختار بازی نمانده، متن پردازش‌شده دیگر لازم نیست
+        if not self._stack and not self._in_string:
+            self._text, self._pos = "", 0
+        else:
+            self._pos = pos
+        return objects
@@ -0,0 +1,105 @@
+import re
+import json
+from typing import List, Dict, Tuple, Optional
+from app.utils.config import env_bool, env_str
+from app.utils.logger import setup_logger
+from app.utils.parser import Cue
+
+logger = setup_logger("local-rules")
+
+# خطوطی که ترجمه‌شان قاعده‌مند است (اعداد، حروف ندا، نویز) بدون مدل ترجمه می‌شوند
+LOCAL_FAST_PATH = env_bool("LOCAL_FAST_PATH", True)
+# فایل JSON با {"english": "فارسی"} برای افزودن/بازنویسی واژه‌ها
+LOCAL_LEXICON_PATH = env_str("LOCAL_LEXICON_PATH", "")
+
+# کلیدها با حروف کوچک؛ عبارت چندکلمه‌ای هم فقط وقتی کل خط باشد تطبیق می‌خورد
+LEXICON: Dict[str, str] = {
+    "oh": "اوه", "ah": "آه", "aah": "آه", "ooh": "اوه", "hey": "هی", "huh": "هان", "hmm": "هوم",
+    "mm": "اوم", "um": "اِم", "uh": "اِم", "er": "اِم", "wow": "وای", "whoa": "اوه", "ow": "آخ",
+    "ouch": "آخ", "oops": "اوه", "shh": "هیس", "sh": "هیس", "aha": "آها", "yay": "هورا", "ugh": "اَه",
+    "uh-huh": "اوهوم", "mm-hmm": "اوهوم", "uh-oh": "اوه اوه", "yeah": "آره", "yes": "آره",
+    "yep": "آره", "no": "نه", "nope": "نه", "okay": "باشه", "ok": "باشه", "hi": "سلام",
+    "hello": "سلام", "bye": "خداحافظ", "thanks": "مرسی", "sorry": "ببخشید", "what": "چی",
+    "why": "چرا", "who": "کی", "where": "کجا", "really": "واقعاً", "please": "لطفاً",
+    "thank you": "ممنون", "oh my god": "خدای من", "oh god": "وای خدا", "goodbye": "خداحافظ",
+    "good night": "شب بخیر", "excuse me": "ببخشید",
+}
+
+NUMBER = r"\d+(?:[.,:]\d+)*"
+WORD_PATTERN = re.compile(rf"{NUMBER}|[^\W\d_]+(?:['’-][^\W\d_]+)*")
+NUMBER_PATTERN = re.compile(NUMBER)
+# بعد از حذف کلمه‌ها فقط این علامت‌ها و فاصله می‌توانند بمانند
+RESIDUE_PATTERN = re.compile(r"[\s.,!?…:;'\"-]*")
+PERSIAN_DIGITS = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
+# جداکننده هزارگان و ممیز فارسی فقط بین دو رقم
+NUMBER_SEPARATORS = {",": "٬", ".": "٫", ":": ":"}
+PERSIAN_PUNCTUATION = str.maketrans({"?": "؟", ",": "،", ";": "؛"})
+TRAILING_MARKS = " .!?…"
+MUSIC_MARK = "♪"
+
+
+def load_lexicon(path: str) -> int:
+    """Merges a {"english": "persian"} JSON file into LEXICON; returns the number of entries."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Local lexicon {path} not loaded: {e}")
+        return 0
+
+    added = 0
+    for english, persian in entries.items():
+        if isinstance(english, str) and isinstance(persian, str) and english.strip():
+            LEXICON[" ".join(english.lower().split())] = persian.strip()
+            added += 1
+    return added
+
+
+def _persian_number(number: str) -> str:
+    return re.sub(r"(?<=\d)[.,:](?=\d)", lambda m: NUMBER_SEPARATORS[m.group()], number).translate(PERSIAN_DIGITS)
+
+
+def _translate_word(word: str) -> Optional[str]:
+    if NUMBER_PATTERN.fullmatch(word):
+        return _persian_number(word)
+    return LEXICON.get(word.lower().replace("’", "'"))
+
+
+def resolve_text(clean: str, original: str) -> Optional[str]:
+    """Local translation of one cleaned line, or None when it needs the model."""
+    if not clean:
+        # خطوطی که پاکسازی کاملاً حذفشان کرده (نویز/برچسب)؛ موسیقی فقط با علامت نت می‌ماند
+        return MUSIC_MARK if "♪" in original or "♫" in original else ""
+
+    words = WORD_PATTERN.findall(clean)
+    if not words or not RESIDUE_PATTERN.fullmatch(WORD_PATTERN.sub("", clean)):
+        return None
+
+    phrase = LEXICON.get(" ".join(word.lower() for word in words)) if len(words) > 1 else None
+    if phrase is not None:
+        # علامت پایانی خط (مثل ! یا ?) حفظ می‌شود
+        ending = clean[len(clean.rstrip(TRAILING_MARKS)):].strip()
+        return phrase + ending.translate(PERSIAN_PUNCTUATION)
+
+    translated = [_translate_word(word) for word in words]
+    if any(text is None for text in translated):
+        return None
+    replacements = iter(translated)
+    return WORD_PATTERN.sub(lambda _: next(replacements), clean).translate(PERSIAN_PUNCTUATION)
+
+
+def resolve_locally(blocks: List[Cue]) -> Tuple[List[Dict], List[Cue]]:
+    """Splits blocks into (locally translated items, blocks that still need the model)."""
+    local: List[Dict] = []
+    remaining: List[Cue] = []
+    for block in blocks:
+        translated = resolve_text(block.clean, block.text)
+        if translated is None:
+            remaining.append(block)
+        else:
+            local.append({"index": block.index, "translated": translated, "local": True})
+    return local, remaining
+
+
+if LOCAL_LEXICON_PATH:
+    logger.info(f"Loaded {load_lexicon(LOCAL_LEXICON_PATH)} local lexicon entries from {LOCAL_LEXICON_PATH}")
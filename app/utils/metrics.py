@@ -0,0 +1,263 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, List, Tuple, Optional, Callable, Iterator, Any
+
+# ثانیه؛ از چند میلی‌ثانیه (مراحل CPU) تا چند دقیقه (کل ترجمه)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def labels(self, **labels: Any):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def family(self) -> str:
+        """Name used in the # HELP / # TYPE lines."""
+        return self.name
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for key, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, key)))
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield f"{name}_total", labels, self.value
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield f"{name}_bucket", {**labels, "le": "+Inf"}, self.count
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def family(self) -> str:
+        # در فرمت 0.0.4 نمونه‌ها x_total هستند؛ TYPE با نام دیگر آن‌ها را untyped می‌کند
+        return f"{self.name}_total"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self.metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Called before every scrape, e.g. to refresh gauges from live objects."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        for collector in self.collectors:
+            collector()
+
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.family()} {metric.documentation}")
+            lines.append(f"# TYPE {metric.family()} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (زمان شروع trace، لیست spanها)؛ taskهای فرزند همان لیست را می‌بینند
+_current_trace: ContextVar[Optional[Tuple[float, List[Dict[str, Any]]]]] = ContextVar("subtrans_trace", default=None)
+
+
+def start_trace() -> Token:
+    return _current_trace.set((time.perf_counter(), []))
+
+
+def finish_trace(token: Token) -> List[Dict[str, Any]]:
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    return trace[1] if trace else []
+
+
+def record_span(name: str, started: float, elapsed: float, **attributes: Any) -> None:
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    origin, spans = trace
+    spans.append({
+        "name": name,
+        "start_ms": round((started - origin) * 1000, 2),
+        "duration_ms": round(elapsed * 1000, 2),
+        **attributes
+    })
+
+
+@contextmanager
+def timed(histogram_child=None, span: Optional[str] = None, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Observes the block's wall time into a histogram child and, inside a trace, records it as a span.
+    The yielded dict can be filled with extra span attributes (e.g. the outcome).
+    """
+    extra: Dict[str, Any] = {}
+    started = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram_child is not None:
+            histogram_child.observe(elapsed)
+        if span:
+            record_span(span, started, elapsed, **attributes, **extra)
+
+
+# --- متریک‌های برنامه ---
+
+STAGE_SECONDS = Histogram("subtrans_stage_seconds", "Wall time of pipeline stages", ("stage",))
+TRANSLATIONS = Counter("subtrans_translations", "Translation pipeline runs by kind and outcome", ("kind", "outcome"))
+RESULT_CACHE_REQUESTS = Counter(
+    "subtrans_result_cache_requests", "/translate requests by result cache outcome (hit, coalesced, miss)", ("outcome",)
+)
+RESULT_CACHE_ENTRIES = Gauge("subtrans_result_cache_entries", "Cached /translate results")
+CUES = Counter("subtrans_cues", "Cues by where their translation came from", ("source",))
+
+TIMELINE_ADJUSTMENTS = Counter(
+    "subtrans_timeline_adjustments", "Cues retimed or flagged before writing, by kind", ("kind",)
+)
+
+CHUNK_SECONDS = Histogram("subtrans_chunk_seconds", "Wall time of translate_chunk including retries and repairs")
+RETRIES = Counter("subtrans_llm_retries", "Chunk retries by error kind", ("kind",))
+RETRY_SLEEP_SECONDS = Histogram("subtrans_retry_sleep_seconds", "Backoff sleeps before chunk retries", ("kind",))
+REPAIR_ROUNDS = Counter("subtrans_repair_rounds", "Targeted re-requests for missing or invalid lines")
+
+LLM_REQUEST_SECONDS = Histogram(
+    "subtrans_llm_request_seconds", "Provider call latency from slot acquisition to end of stream",
+    ("provider", "outcome")
+)
+LLM_ERRORS = Counter("subtrans_llm_errors", "Provider call failures by error kind (rate_limit = 429)", ("provider", "kind"))
+LLM_TOKENS = Counter(
+    "subtrans_llm_tokens", "Provider-reported tokens; direction is input, cached_input (part of input) or output",
+    ("provider", "direction")
+)
+LLM_TOKENS_ESTIMATED = Counter(
+    "subtrans_llm_tokens_estimated", "Estimated tokens for calls whose provider reported no usage", ("provider", "direction")
+)
+DISPATCHER_WAIT_SECONDS = Histogram(
+    "subtrans_dispatcher_wait_seconds", "Time spent waiting for a provider rate/concurrency slot", ("provider",)
+)
+
+DISPATCHER_LIMIT = Gauge("subtrans_dispatcher_concurrency_limit", "Current AIMD concurrency limit", ("provider",))
+DISPATCHER_ACTIVE = Gauge("subtrans_dispatcher_active", "Provider calls in flight", ("provider",))
+DISPATCHER_WAITING = Gauge("subtrans_dispatcher_waiting", "Calls queued for a provider slot", ("provider",))
+CIRCUIT_OPEN = Gauge("subtrans_circuit_open", "1 while the provider circuit breaker is open", ("provider",))
+JOB_QUEUE_DEPTH = Gauge("subtrans_job_queue_depth", "Queued background translation jobs")
+CPU_POOL_ACTIVE = Gauge("subtrans_cpu_pool_active", "CPU pool jobs running")
+CPU_POOL_WAITING = Gauge("subtrans_cpu_pool_waiting", "CPU pool jobs waiting for a slot")
+LLM_HTTP_CONNECTIONS = Gauge("subtrans_llm_http_connections", "Connections in the shared LLM HTTP pool", ("state",))
+LLM_HTTP_ACTIVE = Gauge("subtrans_llm_http_active_requests", "LLM HTTP requests from send until the body is closed")
+LLM_HTTP_SATURATION = Gauge("subtrans_llm_http_saturation", "Active LLM HTTP requests / max_connections")
@@ -0,0 +1,29 @@
+from typing import List, Dict, Any, Optional, Tuple
+from app.utils.decoder import decode_subtitle_bytes
+from app.utils.fingerprint import content_fingerprint
+from app.utils.parser import parse_srt_content, Cue
+from app.utils.timeline import normalize_subtitle_timeline
+from app.utils.cleaner import prepare_for_translation
+
+
+def preprocess_subtitle(content: bytes, decoded_text: Optional[str] = None) -> List[Cue]:
+    """
+    decode → parse → normalize → clean; pure CPU, safe to run in a worker thread or process.
+    `decoded_text` skips the decode when the caller already has it (see decoded_fingerprint).
+    """
+    # همه مراحل روی همان لیست cueها کار می‌کنند؛ cleaner فقط cue.clean را پر می‌کند
+    if decoded_text is None:
+        decoded_text = decode_subtitle_bytes(content)
+    parsed_blocks = parse_srt_content(decoded_text)
+    del decoded_text
+    normalized_blocks = normalize_subtitle_timeline(parsed_blocks)
+    return prepare_for_translation(normalized_blocks)
+
+
+def decoded_fingerprint(content: bytes, params: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    (fingerprint, decoded text): the fingerprint covers the decoded text, so the same subtitles re-saved
+    with another encoding or BOM match. The text is passed on to preprocess_subtitle on a cache miss.
+    """
+    decoded_text = decode_subtitle_bytes(content)
+    return content_fingerprint(decoded_text.encode("utf-8"), params), decoded_text
@@ -0,0 +1,135 @@
+import re
+from typing import List, Dict, Tuple, Iterator
+from app.utils.config import env_bool, env_int
+from app.utils.parser import Cue
+from app.utils.cleaner import PATTERNS, DASHES
+
+# ترجمه جمله‌ای: cueهای پشت سر هم یک جمله یک آیتم می‌شوند و ترجمه به نسبت مدت زمان تقسیم می‌شود
+SENTENCE_MERGE = env_bool("SENTENCE_MERGE", False)
+MERGE_MAX_CUES = env_int("SENTENCE_MERGE_MAX_CUES", 3)
+MERGE_MAX_GAP_MS = env_int("SENTENCE_MERGE_MAX_GAP_MS", 1500)
+MERGE_MAX_CHARS = env_int("SENTENCE_MERGE_MAX_CHARS", 250)
+
+# مرز کلمه بعد از این علامت‌ها برای برش ترجمه ترجیح داده می‌شود (به اندازه چند کاراکتر فاصله)
+SPLIT_PUNCTUATION = re.compile(r"[.!?؟،,;؛:…»\"]$")
+PUNCTUATION_BONUS_CHARS = 6
+# وقتی کلمه کافی برای همه cueها نیست، cue بی‌متن این را نشان می‌دهد (نه متن انگلیسی)
+EMPTY_PIECE = "..."
+
+
+def merge_sentences(cues: List[Cue]) -> Tuple[List[Cue], Dict[int, List[Cue]]]:
+    """
+    Joins consecutive cues of one sentence into a unit Cue carrying the first cue's index.
+    A unit ends at sentence punctuation, a new speaker dash, a gap over MERGE_MAX_GAP_MS,
+    MERGE_MAX_CUES cues or MERGE_MAX_CHARS. Returns (units, member cues by unit index).
+    """
+    units: List[Cue] = []
+    members: Dict[int, List[Cue]] = {}
+    current: List[Cue] = []
+
+    def flush() -> None:
+        if len(current) == 1:
+            units.append(current[0])
+        elif current:
+            first, last = current[0], current[-1]
+            unit = Cue(
+                first.index, first.start_ms, last.end_ms,
+                "\n".join(cue.text for cue in current), " ".join(cue.clean for cue in current)
+            )
+            units.append(unit)
+            members[unit.index] = list(current)
+        current.clear()
+
+    for cue in cues:
+        if not cue.clean:
+            # نویز/خالی جمله را قطع می‌کند و خودش دست‌نخورده می‌ماند
+            flush()
+            units.append(cue)
+            continue
+        if current and not _continues(current, cue):
+            flush()
+        current.append(cue)
+    flush()
+
+    return units, members
+
+
+def _continues(current: List[Cue], cue: Cue) -> bool:
+    last = current[-1]
+    return (
+        len(current) < MERGE_MAX_CUES
+        and not PATTERNS["sent_end"].search(last.clean)
+        and last.end_ms <= cue.start_ms <= last.end_ms + MERGE_MAX_GAP_MS
+        and not cue.text.lstrip().startswith(DASHES)
+        and sum(len(c.clean) + 1 for c in current) + len(cue.clean) <= MERGE_MAX_CHARS
+    )
+
+
+def split_translation(text: str, members: List[Cue]) -> List[str]:
+    """
+    Splits a unit's translation across its cues in proportion to their durations, cutting at
+    word boundaries and preferring ones after punctuation.
+    """
+    words = text.split()
+    count = len(members)
+    if len(words) < count:
+        return words + [EMPTY_PIECE] * (count - len(words))
+
+    # طول تجمعی متن تا انتهای هر کلمه (با فاصله)
+    ends: List[int] = []
+    position = 0
+    for word in words:
+        position += len(word) + 1
+        ends.append(position)
+    total_chars = position
+
+    durations = [max(1, cue.duration_ms) for cue in members]
+    total_duration = sum(durations)
+
+    pieces: List[str] = []
+    start = 0
+    elapsed = 0
+    for k in range(count - 1):
+        elapsed += durations[k]
+        target = total_chars * elapsed / total_duration
+        # هر cue باقی‌مانده حداقل یک کلمه می‌گیرد
+        last_allowed = len(words) - (count - 1 - k)
+        cut = min(
+            range(start + 1, last_allowed + 1),
+            key=lambda j: abs(ends[j - 1] - target)
+            - (PUNCTUATION_BONUS_CHARS if SPLIT_PUNCTUATION.search(words[j - 1]) else 0)
+        )
+        pieces.append(" ".join(words[start:cut]))
+        start = cut
+    pieces.append(" ".join(words[start:]))
+    return pieces
+
+
+def expand_unit(index: int, translated: str, members: Dict[int, List[Cue]]) -> Iterator[Tuple[int, str]]:
+    """(cue index, text) for every original cue of a unit; a plain cue yields itself."""
+    unit = members.get(index)
+    if unit is None:
+        yield index, translated
+        return
+    for cue, piece in zip(unit, split_translation(translated, unit)):
+        yield cue.index, piece
+
+
+def expand_units(items: List[Dict], members: Dict[int, List[Cue]]) -> List[Dict]:
+    """Unit results -> per-cue results; a fallback unit gives each cue its own source line back."""
+    if not members:
+        return items
+
+    expanded = []
+    for item in items:
+        unit = members.get(item["index"])
+        if unit is None:
+            expanded.append(item)
+        elif item.get("fallback"):
+            expanded.extend({**item, "index": cue.index, "translated": cue.clean} for cue in unit)
+        else:
+            expanded.extend(
+                {**item, "index": index, "translated": piece}
+                for index, piece in expand_unit(item["index"], item["translated"], members)
+            )
+    return expanded
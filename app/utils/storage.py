@@ -1,29 +1,186 @@
 import os
 import json
-import re
-from datetime import datetime
+import time
+import zlib
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from app.utils.config import env_str, env_int
+from app.utils.logger import setup_logger
+
+logger = setup_logger("translation-store")
 
 STORAGE_DIR = os.path.join(os.getcwd(), "storage")
+STORAGE_DB_PATH = env_str("STORAGE_DB_PATH", os.path.join(STORAGE_DIR, "translations.sqlite3"))
+# صفر یعنی بدون محدودیت
+STORAGE_RETENTION_DAYS = env_int("STORAGE_RETENTION_DAYS", 30)
+STORAGE_MAX_RECORDS = env_int("STORAGE_MAX_RECORDS", 5000)
+# پاکسازی حداکثر هر چند ثانیه یک بار همراه ذخیره اجرا می‌شود
+EVICTION_INTERVAL_SECONDS = 300
 
-def save_fireworks_translation_data(filename: str, data: dict):
-    try:
-        clean_name = filename.lower().replace(".srt", "")
-        clean_name = re.sub(r'[\s_]+', '-', clean_name)
-        clean_name = re.sub(r'[^\w\-]', '', clean_name)
+METADATA_COLUMNS = ("id", "title", "content_hash", "genre", "model", "srt_path", "lines", "payload_bytes", "created_at")
+# محدودیت تعداد پارامترهای یک کوئری در SQLite
+SQL_BATCH = 500
+
+
+class TranslationStore:
+    """
+    SQLite record of every finished translation: metadata columns indexed by title and content hash,
+    translated lines as zlib-compressed compact JSON. Old records and their SRT files are evicted
+    by age and count.
+    """
+
+    def __init__(self, db_path: str, retention_days: int, max_records: int):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._next_eviction = 0.0
+
+    def save(
+            self,
+            title: str,
+            content_hash: str,
+            genre: str,
+            model: str,
+            srt_path: str,
+            translated_items: List[Dict]
+    ) -> Optional[int]:
+        """Blocking; call through asyncio.to_thread. Failures are logged, the SRT is already on disk."""
+        payload = zlib.compress(
+            json.dumps(translated_items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    record_id = conn.execute(
+                        "INSERT INTO translations "
+                        "(title, content_hash, genre, model, srt_path, lines, payload_bytes, created_at, payload) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (title, content_hash, genre, model, srt_path, len(translated_items), len(payload),
+                         time.time(), payload)
+                    ).lastrowid
+        except sqlite3.Error as e:
+            logger.error(f"Saving translation record for {title} failed: {e}")
+            return None
+
+        if time.monotonic() >= self._next_eviction:
+            self.evict()
+        return record_id
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(METADATA_COLUMNS)}, payload FROM translations WHERE id = ?", (record_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(METADATA_COLUMNS, row))
+        record["translated_data"] = json.loads(zlib.decompress(row[-1]))
+        return record
 
-        movie_folder = os.path.join(STORAGE_DIR, clean_name)
-        if not os.path.exists(movie_folder):
-            os.makedirs(movie_folder)
+    def find(
+            self,
+            title: Optional[str] = None,
+            content_hash: Optional[str] = None,
+            limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Newest-first metadata (without the lines) filtered by title and/or content hash."""
+        conditions, params = [], []
+        if title:
+            conditions.append("title = ?")
+            params.append(title)
+        if content_hash:
+            conditions.append("content_hash = ?")
+            params.append(content_hash)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
 
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        final_filename = f"{clean_name}-{timestamp}.json"
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(METADATA_COLUMNS)} FROM translations {where} "
+                "ORDER BY created_at DESC, id DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [dict(zip(METADATA_COLUMNS, row)) for row in rows]
 
-        file_path = os.path.join(movie_folder, final_filename)
+    def evict(self) -> int:
+        """Deletes records past retention or beyond max_records, plus SRT files no remaining record uses."""
+        self._next_eviction = time.monotonic() + EVICTION_INTERVAL_SECONDS
+        try:
+            with self._lock:
+                conn = self._connect()
+                doomed: List[Tuple[int, str]] = []
+                if self.retention_days > 0:
+                    cutoff = time.time() - self.retention_days * 86400
+                    doomed += conn.execute(
+                        "SELECT id, srt_path FROM translations WHERE created_at < ?", (cutoff,)
+                    ).fetchall()
+                if self.max_records > 0:
+                    doomed += conn.execute(
+                        "SELECT id, srt_path FROM translations ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?",
+                        (self.max_records,)
+                    ).fetchall()
+                if not doomed:
+                    return 0
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+                ids = list({record_id for record_id, _ in doomed})
+                with conn:
+                    for i in range(0, len(ids), SQL_BATCH):
+                        batch = ids[i: i + SQL_BATCH]
+                        conn.execute(f"DELETE FROM translations WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+                # هر اجرا فایل SRT خودش را دارد (storage/srt/<title>/<run id>.srt)، ولی رکوردهای قبل از آن
+                # برای یک عنوان یک مسیر مشترک دارند؛ فایلی که رکورد دیگری هنوز به آن اشاره می‌کند پاک نمی‌شود
+                orphaned = [
+                    path for path in {path for _, path in doomed if path}
+                    if not conn.execute("SELECT 1 FROM translations WHERE srt_path = ? LIMIT 1", (path,)).fetchone()
+                ]
+        except sqlite3.Error as e:
+            logger.error(f"Translation store eviction failed: {e}")
+            return 0
+
+        for path in orphaned:
+            _remove_output(path)
+        logger.info(f"Evicted {len(ids)} translation records and {len(orphaned)} SRT files")
+        return len(ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            records, payload_bytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(payload_bytes), 0) FROM translations"
+            ).fetchone()
+        return {
+            "records": records,
+            "payload_bytes": payload_bytes,
+            "retention_days": self.retention_days,
+            "max_records": self.max_records
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, content_hash TEXT NOT NULL, "
+                "genre TEXT, model TEXT, srt_path TEXT, lines INTEGER NOT NULL, payload_bytes INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, payload BLOB NOT NULL)"
+            )
+            for column in ("title", "content_hash", "created_at", "srt_path"):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS translations_{column} ON translations ({column})")
+        return self._conn
+
+
+def _remove_output(path: str) -> None:
+    try:
+        os.remove(path)
+        # پوشه عنوان اگر خالی شد هم پاک می‌شود
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
 
-        return file_path
 
-    except Exception as e:
-        return None
\ No newline at end of file
+translation_store = TranslationStore(STORAGE_DB_PATH, STORAGE_RETENTION_DAYS, STORAGE_MAX_RECORDS)
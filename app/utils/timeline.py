@@ -1,39 +1,145 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple, Sequence
+import numpy as np
+from app.utils.config import env_bool, env_int, env_float
 from app.utils.logger import setup_logger
+from app.utils.parser import Cue
 
 logger = setup_logger("srt-timeline")
 
-def normalize_subtitle_timeline(subtitles: List[Dict]) -> List[Dict]:
-    normalized = []
-    previous_end = None
+# زمان‌بندی دوباره بر اساس طول ترجمه، پیش از نوشتن فایل
+TIMELINE_RETIME = env_bool("TIMELINE_RETIME", True)
+# پیش‌فرض‌ها از راهنمای زیرنویس استریم‌ها: حداقل ۵/۶ ثانیه، فاصله ۲ فریم، ۱۷ کاراکتر در ثانیه
+MIN_DURATION_MS = env_int("TIMELINE_MIN_DURATION_MS", 833)
+MIN_GAP_MS = env_int("TIMELINE_MIN_GAP_MS", 83)
+MAX_CPS = env_float("TIMELINE_MAX_CPS", 17.0)
+MAX_DURATION_MS = env_int("TIMELINE_MAX_DURATION_MS", 7000)
 
-    for sub in subtitles:
-        try:
-            start_ms = timestamp_to_ms(sub["start"])
-            end_ms = timestamp_to_ms(sub["end"])
+# پرچم‌های هر cue در خروجی retime
+OVERLAP_FIXED = 1
+OVERLAP_KEPT = 2
+EXTENDED = 4
+TOO_SHORT = 8
+CPS_EXCEEDED = 16
+# پایان cue فقط برای رعایت فاصله حداقل با cue بعدی کوتاه شده (هم‌پوشانی نداشته)
+GAP_ENFORCED = 32
+FLAG_NAMES = {
+    OVERLAP_FIXED: "overlaps_fixed",
+    OVERLAP_KEPT: "overlaps_kept",
+    GAP_ENFORCED: "gaps_enforced",
+    EXTENDED: "extended",
+    TOO_SHORT: "too_short",
+    CPS_EXCEEDED: "cps_exceeded",
+}
+# تعداد ایندکس‌هایی که در هشدارها نام برده می‌شوند
+LOG_SAMPLE = 10
 
-            if start_ms >= end_ms:
-                raise ValueError("Start >= End")
 
-            if previous_end is not None and start_ms < previous_end:
-                logger.warning(f"Overlap at #{sub['index']}")
+def cue_arrays(cues: Sequence[Cue]) -> Tuple[np.ndarray, np.ndarray]:
+    """(starts, ends) as int64 millisecond arrays."""
+    count = len(cues)
+    starts = np.fromiter((cue.start_ms for cue in cues), dtype=np.int64, count=count)
+    ends = np.fromiter((cue.end_ms for cue in cues), dtype=np.int64, count=count)
+    return starts, ends
 
-            previous_end = end_ms
-            sub.update({"start_ms": start_ms, "end_ms": end_ms, "duration_ms": end_ms - start_ms})
-            normalized.append(sub)
 
-        except Exception as exc:
-            logger.warning(f"Skipping timing block #{sub.get('index')}: {exc}")
+def normalize_subtitle_timeline(subtitles: List[Cue]) -> List[Cue]:
+    starts, ends = cue_arrays(subtitles)
 
-    if not normalized:
+    valid = starts < ends
+    if not valid.all():
+        skipped = np.flatnonzero(~valid)
+        logger.warning(f"Skipping {len(skipped)} timing blocks with Start >= End: {_sample(subtitles, skipped)}")
+        keep = np.flatnonzero(valid)
+        subtitles = [subtitles[i] for i in keep.tolist()]
+        starts, ends = starts[keep], ends[keep]
+
+    if not subtitles:
         raise ValueError("No valid timelines")
 
-    return normalized
+    overlaps = np.flatnonzero(starts[1:] < ends[:-1]) + 1
+    if len(overlaps):
+        logger.warning(f"{len(overlaps)} overlapping cues: {_sample(subtitles, overlaps)}")
+
+    return subtitles
+
+
+def retime(
+        starts: np.ndarray,
+        ends: np.ndarray,
+        text_lengths: np.ndarray,
+        min_duration: int = MIN_DURATION_MS,
+        min_gap: int = MIN_GAP_MS,
+        max_cps: float = MAX_CPS,
+        max_duration: int = MAX_DURATION_MS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batch timing repair on millisecond arrays; returns (starts, new ends, flags).
+    Ends are extended to min_duration and to what the text needs at max_cps (up to max_duration),
+    but never into the next cue's start minus min_gap; overlapping ends are clamped the same way.
+    Starts never move.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    lengths = np.asarray(text_lengths, dtype=np.int64)
+    count = len(starts)
+    flags = np.zeros(count, dtype=np.uint8)
+    if not count:
+        return starts.copy(), ends.copy(), flags
+
+    # محاسبات به ترتیب نمایش؛ نتیجه در انتها به ترتیب ورودی برمی‌گردد (فایل‌های عادی از قبل مرتب‌اند)
+    order = None if (starts[1:] >= starts[:-1]).all() else np.argsort(starts, kind="stable")
+    s, e, chars = (starts, ends, lengths) if order is None else (starts[order], ends[order], lengths[order])
+
+    needed = np.ceil(chars * (1000.0 / max_cps)).astype(np.int64)
+    target = np.minimum(np.maximum(needed, min_duration), max_duration)
+    desired = np.maximum(e, s + target)
+
+    limit = np.empty(count, dtype=np.int64)
+    limit[:-1] = s[1:] - min_gap
+    limit[-1] = np.iinfo(np.int64).max
+    new_e = np.minimum(desired, limit)
+
+    # cueهای هم‌زمان (دو گوینده، بالا و پایین صفحه) با clamp عملاً حذف می‌شوند؛ همان‌طور می‌مانند
+    unclampable = new_e - s < np.minimum(e - s, min_duration)
+    new_e = np.where(unclampable, e, new_e)
+
+    next_start = np.append(s[1:], np.iinfo(np.int64).max)
+    flags[(e > next_start) & ~unclampable] |= OVERLAP_FIXED
+    flags[(e > limit) & (e <= next_start) & ~unclampable] |= GAP_ENFORCED
+    flags[(e > next_start) & unclampable] |= OVERLAP_KEPT
+    flags[new_e > e] |= EXTENDED
+    duration = new_e - s
+    flags[duration < min_duration] |= TOO_SHORT
+    flags[chars * 1000 > max_cps * duration] |= CPS_EXCEEDED
+
+    if order is None:
+        return starts.copy(), new_e, flags
+    out_ends = np.empty_like(new_e)
+    out_ends[order] = new_e
+    out_flags = np.empty_like(flags)
+    out_flags[order] = flags
+    return starts.copy(), out_ends, out_flags
+
+
+def retime_cues(cues: List[Cue], texts: Sequence[str]) -> Dict[str, int]:
+    """Applies retime() to the cues in place for the given output texts; returns counts per flag."""
+    if not cues:
+        return {name: 0 for name in FLAG_NAMES.values()}
+
+    starts, ends = cue_arrays(cues)
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(cues))
+    _, new_ends, flags = retime(starts, ends, lengths)
+
+    for i in np.flatnonzero(new_ends != ends).tolist():
+        cues[i].end_ms = int(new_ends[i])
+    return flag_counts(flags)
+
+
+def flag_counts(flags: np.ndarray) -> Dict[str, int]:
+    return {name: int(np.count_nonzero(flags & bit)) for bit, name in FLAG_NAMES.items()}
+
+
+def _sample(cues: Sequence[Cue], positions: np.ndarray) -> str:
+    names = ", ".join(f"#{cues[i].index}" for i in positions[:LOG_SAMPLE].tolist())
+    return names + (" ..." if len(positions) > LOG_SAMPLE else "")
 
-def timestamp_to_ms(ts: str) -> int:
-    try:
-        hms, ms = ts.split(".")
-        h, m, s = map(int, hms.split(":"))
-        return h * 3600000 + m * 60000 + s * 1000 + int(ms)
-    except:
-        raise ValueError(f"Invalid TS: {ts}")
\ No newline at end of file
@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Iterable, Optional
+from app.utils.config import env_str, env_int, env_bool
+from app.utils.storage import STORAGE_DIR, SQL_BATCH
+from app.utils.parser import Cue
+from app.utils.logger import setup_logger
+
+logger = setup_logger("translation-memory")
+
+TM_ENABLED = env_bool("TM_ENABLED", True)
+TM_DB_PATH = env_str("TM_DB_PATH", os.path.join(STORAGE_DIR, "translation_memory.sqlite3"))
+TM_LRU_SIZE = env_int("TM_LRU_SIZE", 50000)
+
+
+def normalize_line(text: str) -> str:
+    return " ".join(text.split())
+
+
+class TranslationMemory:
+    """
+    Cleaned-line -> Persian cache: an in-process LRU in front of a SQLite table.
+    Keys cover the normalized line, genre tone, model and prompt version.
+    """
+
+    def __init__(self, db_path: str, lru_size: int = 50000):
+        self.db_path = db_path
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.lru_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def make_key(text: str, genre_tone: str, model: str, prompt_version: str) -> str:
+        raw = "\x1f".join((normalize_line(text), genre_tone, model, prompt_version))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        disk_keys = []
+
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                    self.lru_hits += 1
+                else:
+                    disk_keys.append(key)
+
+            conn = self._connect()
+            for i in range(0, len(disk_keys), SQL_BATCH):
+                batch = disk_keys[i: i + SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT key, translated FROM memory WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, translated in rows:
+                    found[key] = translated
+                    self._remember(key, translated)
+                    self.disk_hits += 1
+
+            self.misses += len(disk_keys) - sum(1 for k in disk_keys if k in found)
+
+        return found
+
+    def put_many(self, entries: Dict[str, Tuple[str, str]]) -> None:
+        """entries: key -> (source line, translated line)"""
+        if not entries:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO memory (key, source, translated) VALUES (?, ?, ?)",
+                    [(key, source, translated) for key, (source, translated) in entries.items()]
+                )
+            for key, (_, translated) in entries.items():
+                self._remember(key, translated)
+            self.writes += len(entries)
+
+    def stats(self) -> dict:
+        lookups = self.lru_hits + self.disk_hits + self.misses
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        return {
+            "entries": entries,
+            "lru_entries": len(self._lru),
+            "lru_hits": self.lru_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round((self.lru_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+        }
+
+    def _remember(self, key: str, translated: str) -> None:
+        self._lru[key] = translated
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS memory ("
+                "key TEXT PRIMARY KEY, source TEXT NOT NULL, translated TEXT NOT NULL, "
+                "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+        return self._conn
+
+
+def partition_blocks(
+        blocks: List[Cue],
+        genre_tone: str,
+        model: str,
+        prompt_version: str
+) -> Tuple[List[Dict], List[Cue], Dict[int, List[int]], Dict[int, str]]:
+    """
+    Splits cleaned blocks into (memory hits, unique pending blocks, duplicates, pending keys).
+    Empty lines are skipped; every repeated line is sent once and fanned out afterwards.
+    """
+    hits: List[Dict] = []
+    pending: List[Cue] = []
+    duplicates: Dict[int, List[int]] = {}
+    pending_keys: Dict[int, str] = {}
+
+    first_by_key: Dict[str, Cue] = {}
+    for block in blocks:
+        if not block.clean.strip():
+            continue
+        key = TranslationMemory.make_key(block.clean, genre_tone, model, prompt_version)
+        if key in first_by_key:
+            duplicates.setdefault(first_by_key[key].index, []).append(block.index)
+        else:
+            first_by_key[key] = block
+
+    cached = translation_memory.get_many(first_by_key) if TM_ENABLED else {}
+
+    for key, block in first_by_key.items():
+        if key in cached:
+            hits.append({"index": block.index, "translated": cached[key]})
+        else:
+            pending.append(block)
+            pending_keys[block.index] = key
+
+    return hits, pending, duplicates, pending_keys
+
+
+def remember_translations(
+        pending: List[Cue],
+        translated_items: List[Dict],
+        pending_keys: Dict[int, str]
+) -> None:
+    if not TM_ENABLED:
+        return
+
+    sources = {block.index: block.clean for block in pending}
+    entries = {}
+    for item in translated_items:
+        if item.get("fallback") or not str(item.get("translated", "")).strip():
+            continue
+        key = pending_keys.get(item["index"])
+        if key:
+            entries[key] = (normalize_line(sources[item["index"]]), item["translated"])
+
+    try:
+        translation_memory.put_many(entries)
+    except sqlite3.Error as e:
+        logger.error(f"Translation memory write failed: {e}")
+
+
+def expand_duplicates(items: List[Dict], duplicates: Dict[int, List[int]]) -> List[Dict]:
+    expanded = []
+    for item in items:
+        expanded.append(item)
+        for dup_index in duplicates.get(item["index"], ()):
+            expanded.append({**item, "index": dup_index})
+    return expanded
+
+
+translation_memory = TranslationMemory(TM_DB_PATH, TM_LRU_SIZE)
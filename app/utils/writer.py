@@ -0,0 +1,108 @@
+import os
+import codecs
+import tempfile
+from typing import List, Dict, Iterator, Tuple
+from app.utils.config import env_int
+from app.utils.parser import Cue
+from app.utils.timeline import retime_cues, TIMELINE_RETIME
+from app.utils.logger import setup_logger
+
+logger = setup_logger("srt-writer")
+
+SIGNATURE_TEXT = "{\\an8}Localized by AI Architecture"
+SRT_WRITE_BUFFER = env_int("SRT_WRITE_BUFFER", 64 * 1024)
+
+
+def output_text(cue: Cue, trans_map: Dict[str, str]) -> str:
+    """
+    The text written for a cue: its translation (an empty one from the local rules stays empty),
+    else nothing for sound cues, else the original.
+    """
+    translated_text = trans_map.get(str(cue.index))
+
+    # منطق انتخاب متن
+    if translated_text is None:
+        if "[" in cue.text or "]" in cue.text or "♪" in cue.text:
+            return ""
+        return cue.text
+
+    # حذف کاراکترهای کنترلی برای جلوگیری از نمایش "مربع" در پلیرهای قدیمی
+    return translated_text.strip().replace('\u200f', '').replace('\u200e', '')
+
+
+def iter_srt_entries(cues: List[Cue], trans_map: Dict[str, str]) -> Iterator[str]:
+    """One formatted SRT entry per output cue, signature first and last."""
+    current_idx = 1  # شمارنده هوشمند برای مدیریت ترتیب ایندکس‌ها
+
+    # ۱. اضافه کردن امضا به ابتدای فیلم (ثانیه ۱ تا ۵)
+    yield f"{current_idx}\n00:00:01,000 --> 00:00:05,000\n{SIGNATURE_TEXT}\n\n"
+    current_idx += 1
+
+    # ۲. ساخت بدنه اصلی زیرنویس
+    for cue in cues:
+        yield f"{current_idx}\n{cue.start} --> {cue.end}\n{output_text(cue, trans_map)}\n\n"
+        current_idx += 1
+
+    # ۳. اضافه کردن امضا به انتهای فیلم، از پایان آخرین دیالوگ
+    if cues:
+        yield f"{current_idx}\n{cues[-1].end} --> 99:00:00.000\n{SIGNATURE_TEXT}\n\n"
+
+
+def iter_srt_bytes(
+        cues: List[Cue],
+        trans_map: Dict[str, str],
+        buffer_size: int = SRT_WRITE_BUFFER
+) -> Iterator[bytes]:
+    """UTF-8 with BOM, yielded in ~buffer_size pieces (for files and StreamingResponse alike)."""
+    encoder = codecs.getincrementalencoder("utf-8-sig")()
+    pending: List[str] = []
+    size = 0
+    for entry in iter_srt_entries(cues, trans_map):
+        pending.append(entry)
+        size += len(entry)
+        if size >= buffer_size:
+            yield encoder.encode("".join(pending))
+            pending, size = [], 0
+    yield encoder.encode("".join(pending), final=True)
+
+
+def render_srt(cues: List[Cue], trans_map: Dict[str, str]) -> str:
+    return "".join(iter_srt_entries(cues, trans_map))
+
+
+def write_srt_atomic(path: str, cues: List[Cue], trans_map: Dict[str, str]) -> str:
+    """
+    Writes to a temp file next to `path` and renames it into place, so readers (downloads,
+    a concurrent request for the same title) never see a half-written file.
+    """
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for piece in iter_srt_bytes(cues, trans_map):
+                f.write(piece)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp فایل را 0600 می‌سازد؛ همان دسترسی open معمولی
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def finalize_srt(path: str, cues: List[Cue], trans_map: Dict[str, str]) -> Tuple[str, Dict[str, int]]:
+    """
+    Retimes the cues for their translated text (see timeline.retime) and writes the file atomically.
+    Runs as one CPU-pool job, so in process mode the retimed cues never need to travel back.
+    """
+    stats: Dict[str, int] = {}
+    if TIMELINE_RETIME:
+        stats = retime_cues(cues, [output_text(cue, trans_map) for cue in cues])
+    return write_srt_atomic(path, cues, trans_map), stats
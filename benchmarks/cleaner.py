@@ -0,0 +1,100 @@
+"""
+Before/after benchmark for the subtitle cleaner, plus an equivalence fuzz against the
+original per-pattern implementation.
+
+    python -m benchmarks.cleaner --cues 10000 --repeat 5 --fuzz 200000
+"""
+import re
+import sys
+import random
+import argparse
+from typing import List
+
+from benchmarks.common import timed, save_results
+from benchmarks.synthetic import make_srt_text
+from app.utils.parser import parse_srt_content
+from app.utils.cleaner import PATTERNS, CONTRACTIONS, clean_subtitle_text, clean_subtitle_texts
+
+
+def legacy_clean_subtitle_text(text: str) -> str:
+    # پیاده‌سازی قبلی، بدون تغییر، به‌عنوان مرجع خروجی
+    text = PATTERNS["control"].sub("", text)
+    text = PATTERNS["html"].sub("", text)
+    text = PATTERNS["noise"].sub("", text)
+    text = PATTERNS["stutter"].sub(r"\1\2\3", text)
+
+    for k, v in CONTRACTIONS.items():
+        text = re.sub(rf"\b{k}\b", v, text, flags=re.IGNORECASE)
+
+    if text.isupper(): text = text.capitalize()
+    return PATTERNS["space"].sub(" ", text).strip()
+
+
+FUZZ_PIECES = [
+    "I'm", "i'M", "you're", "YOU'RE", "it's", "It'S", "don't", "gonna", "GONNA", "wanna", "Wanna",
+    "<i>", "</i>", "<font color=red>", "<", ">", "♪", "♫", "[", "]", "(", ")", "JOHN:", "MAN 2:", "A:",
+    "-", "--", "–", "—", "I-I", "w-what", "no-- no", "so--so", "‏", "‎", "﻿", "‫",
+    " ", "  ", "\t", "\n", " ", "　", "\x00", "hello", "HELLO", "World", "ſ", "K", "ı", "İ",
+    "سلام", "!", "?", ".", "'", "nna", "x",
+]
+
+
+def fuzz_text(rng: random.Random) -> str:
+    pieces = [rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 12))]
+    if rng.random() < 0.1:
+        pieces.append(chr(rng.randint(0, 0x2FFF)))
+    return "".join(pieces)
+
+
+def verify(count: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    mismatches = 0
+    batch: List[str] = []
+    for _ in range(count):
+        text = fuzz_text(rng)
+        batch.append(text)
+        expected = legacy_clean_subtitle_text(text)
+        if clean_subtitle_text(text) != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"mismatch: {text!r} -> {clean_subtitle_text(text)!r} != {expected!r}", file=sys.stderr)
+    if clean_subtitle_texts(batch) != [legacy_clean_subtitle_text(t) for t in batch]:
+        mismatches += 1
+        print("batched output differs", file=sys.stderr)
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cues", type=int, default=10000)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=100000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    texts = [cue.text for cue in parse_srt_content(make_srt_text(args.cues, args.noise))]
+    assert [legacy_clean_subtitle_text(t) for t in texts] == clean_subtitle_texts(texts)
+
+    legacy = timed(lambda: [legacy_clean_subtitle_text(t) for t in texts], args.repeat)
+    single = timed(lambda: [clean_subtitle_text(t) for t in texts], args.repeat)
+    batched = timed(lambda: clean_subtitle_texts(texts), args.repeat)
+
+    mismatches = verify(args.fuzz) if args.fuzz else None
+    save_results("cleaner", [{
+        "name": f"cleaner/noise{args.noise}/{len(texts)}",
+        "params": {"cues": len(texts), "noise_ratio": args.noise, "fuzz_cases": args.fuzz},
+        "metrics": {
+            "legacy_ms": round(legacy * 1000, 2),
+            "clean_subtitle_text_ms": round(single * 1000, 2),
+            "clean_subtitle_texts_ms": round(batched * 1000, 2),
+            "speedup": round(legacy / batched, 2),
+            "fuzz_mismatches": mismatches,
+        },
+    }], args.out)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
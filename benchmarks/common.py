@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from typing import List, Dict, Callable, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    """Best wall time of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def environment() -> Dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(suite: str, results: List[Dict], out: Optional[str] = None) -> str:
+    """
+    Writes {"suite", "environment", "results": [{"name", "params", "metrics"}]} and prints it.
+    Metric names ending in `_per_s` or `speedup` are higher-is-better, everything else lower-is-better
+    (see benchmarks/compare.py).
+    """
+    document = {"suite": suite, "environment": environment(), "results": results}
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{suite}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+
+    json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+    print(f"\nsaved {out}")
+    return out
@@ -0,0 +1,63 @@
+"""
+Compares two benchmark result files and exits non-zero on regressions.
+
+    python -m benchmarks.compare benchmarks/results/stages-old.json benchmarks/results/stages-new.json --threshold 0.1
+
+Metrics ending in `_per_s` or `speedup` are higher-is-better, all others lower-is-better.
+"""
+import sys
+import json
+import argparse
+from typing import Dict, Tuple
+
+HIGHER_IS_BETTER = ("_per_s", "speedup")
+
+
+def load(path: str) -> Tuple[Dict, Dict[str, Dict[str, float]]]:
+    with open(path, encoding="utf-8") as f:
+        document = json.load(f)
+    return document, {result["name"]: result["metrics"] for result in document["results"]}
+
+
+def change(metric: str, base: float, new: float) -> float:
+    """Relative change where positive always means worse."""
+    if not base:
+        return 0.0
+    delta = (new - base) / base
+    return -delta if metric.endswith(HIGHER_IS_BETTER) else delta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    parser.add_argument("--metrics", default=None, help="comma-separated subset of metrics to compare")
+    args = parser.parse_args()
+
+    base_doc, base = load(args.baseline)
+    new_doc, new = load(args.candidate)
+    only = set(args.metrics.split(",")) if args.metrics else None
+    print(f"baseline {base_doc['environment'].get('git_revision')}  candidate {new_doc['environment'].get('git_revision')}")
+
+    regressions = 0
+    for name in sorted(base.keys() & new.keys()):
+        for metric, base_value in base[name].items():
+            if metric not in new[name] or (only and metric not in only):
+                continue
+            new_value = new[name][metric]
+            worse = change(metric, base_value, new_value)
+            flag = "REGRESSION" if worse > args.threshold else ("improved" if worse < -args.threshold else "")
+            regressions += flag == "REGRESSION"
+            delta = (new_value - base_value) / base_value if base_value else 0.0
+            print(f"{name:55} {metric:24} {base_value:>12} -> {new_value:>12}  {delta:+7.1%} {flag}")
+
+    for name in sorted(base.keys() ^ new.keys()):
+        print(f"{name:55} only in {'baseline' if name in base else 'candidate'}")
+
+    print(f"{regressions} regression(s) over {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
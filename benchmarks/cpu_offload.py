@@ -0,0 +1,95 @@
+"""
+Event-loop latency of small requests while a large upload is preprocessed.
+
+    python -m benchmarks.cpu_offload --cues 200000 --probes 200
+
+For each CPU_POOL_KIND (inline/thread/process) it fires a tiny request every few ms
+against the ASGI app while one big file goes through preprocessing, and prints p50/p99.
+With the pool, p99 should stay close to the idle baseline.
+"""
+import os
+import time
+import argparse
+import asyncio
+
+os.environ.setdefault("LLM_PROVIDERS", "")
+
+import httpx
+from benchmarks.common import percentile, save_results
+from benchmarks.synthetic import make_srt
+
+
+async def probe(client: httpx.AsyncClient, interval: float, latencies: list, stop: asyncio.Event) -> None:
+    # open loop: latency is measured from when the request *should* have been sent,
+    # so time the event loop was blocked counts against it
+    due = time.perf_counter()
+    while not stop.is_set():
+        await client.get("/memory/stats")
+        latencies.append(time.perf_counter() - due)
+        due += interval
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+
+
+async def run_kind(kind: str, content: bytes, probes: int, interval: float) -> dict:
+    from app.services import cpu_pool as cpu_pool_module
+    from app.utils.preprocess import preprocess_subtitle
+    from app.main import app
+
+    pool = cpu_pool_module.CPUWorkerPool(kind, cpu_pool_module.CPU_POOL_WORKERS, cpu_pool_module.CPU_MAX_CONCURRENT_JOBS)
+    pool.start()
+    # گرم کردن pool (spawn پروسه‌ها جزو اندازه‌گیری نیست)
+    await pool.run(preprocess_subtitle, make_srt(10))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        idle: list = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, interval, idle, stop))
+        await asyncio.sleep(probes * interval / 4)
+        stop.set()
+        await task
+
+        loaded: list = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, interval, loaded, stop))
+        await asyncio.sleep(interval * 4)
+        started = time.perf_counter()
+        cues = len(await pool.run(preprocess_subtitle, content))
+        heavy_seconds = time.perf_counter() - started
+        # probeهایی که پشت حلقه مسدود مانده‌اند هم ثبت شوند
+        await asyncio.sleep(interval * 4)
+        stop.set()
+        await task
+
+    pool.shutdown()
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "name": f"cpu_offload/{kind}/{cues}",
+        "params": {"kind": kind, "cues": cues, "workers": pool.workers, "probe_interval_s": interval},
+        "metrics": {
+            "preprocess_ms": ms(heavy_seconds),
+            "idle_p50_ms": ms(percentile(idle, 0.5)),
+            "idle_p99_ms": ms(percentile(idle, 0.99)),
+            "loaded_p50_ms": ms(percentile(loaded, 0.5)),
+            "loaded_p99_ms": ms(percentile(loaded, 0.99)),
+            "loaded_max_ms": ms(max(loaded)),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cues", type=int, default=100000)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--kinds", default="inline,thread,process")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    content = make_srt(args.cues)
+    results = [asyncio.run(run_kind(kind, content, args.probes, args.interval)) for kind in args.kinds.split(",")]
+    save_results("cpu_offload", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+End-to-end /translate throughput against the local mock LLM server.
+
+    python -m benchmarks.e2e --cues 2000 --files 4 --latency 0.3 --rate-429 0.05
+
+Every upload has unique lines so translation memory and deduplication don't hide the LLM
+path. The app runs in-process (ASGI) with storage in a temp directory.
+"""
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+from benchmarks.common import save_results, percentile
+from benchmarks.synthetic import make_srt
+from benchmarks.mock_server import MockSettings, start_in_thread
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    # باید قبل از import شدن app تنظیم شود
+    os.environ.update({
+        "LLM_PROVIDERS": "bench",
+        "BENCH_BASE_URL": f"http://127.0.0.1:{args.port}/v1",
+        "BENCH_API_KEY": "bench",
+        "BENCH_MODEL": args.model,
+        "BENCH_RPM": str(args.rpm),
+        "BENCH_TPM": str(args.tpm),
+        "TM_ENABLED": "true" if args.memory else "false",
+        "SENTENCE_MERGE": "true" if args.merge_sentences else "false",
+    })
+
+
+async def run(args: argparse.Namespace, settings: MockSettings) -> dict:
+    import httpx
+    from app.main import app
+
+    uploads = [
+        (f"bench-{i}.srt", make_srt(args.cues, args.noise, seed=args.seed + i, unique=True, split_ratio=args.split_ratio))
+        for i in range(args.files)
+    ]
+    latencies = []
+
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None
+    ) as client:
+        async def upload(name: str, content: bytes) -> int:
+            started = time.perf_counter()
+            response = await client.post(
+                "/translate",
+                files={"file": (name, content, "application/x-subrip")},
+                params={"chunk_size": args.chunk_size}
+            )
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            return response.json()["file_info"]["total_lines"]
+
+        started = time.perf_counter()
+        total_cues = sum(await asyncio.gather(*(upload(name, content) for name, content in uploads)))
+        wall = time.perf_counter() - started
+
+    return {
+        "name": f"e2e/{args.files}x{args.cues}/latency{args.latency}/429rate{args.rate_429}",
+        "params": {
+            "cues_per_file": args.cues, "files": args.files, "latency_s": args.latency, "jitter_s": args.jitter,
+            "rate_429": args.rate_429, "retry_after_s": args.retry_after, "rpm": args.rpm,
+            "chunk_size": args.chunk_size, "memory": args.memory,
+            "split_ratio": args.split_ratio, "merge_sentences": args.merge_sentences,
+        },
+        "metrics": {
+            "wall_s": round(wall, 3),
+            "cues_per_s": round(total_cues / wall, 2),
+            "request_p50_s": round(percentile(latencies, 0.5), 3),
+            "request_max_s": round(max(latencies), 3),
+            "llm_calls": settings.calls,
+            "llm_429s": settings.rate_limited,
+            "llm_lines": settings.lines,
+            "llm_prompt_tokens": settings.prompt_tokens,
+            "llm_uncached_prompt_tokens": settings.prompt_tokens - settings.cached_tokens,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cues", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--model", default="openai/gpt-5-nano")
+    parser.add_argument("--memory", action="store_true", help="keep translation memory enabled")
+    parser.add_argument("--split-ratio", type=float, default=0.0, help="share of cues starting a multi-cue sentence")
+    parser.add_argument("--merge-sentences", action="store_true", help="run with SENTENCE_MERGE=true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out) if args.out else None
+    configure_environment(args)
+    settings = MockSettings(args.latency, args.jitter, args.rate_429, args.retry_after, seed=args.seed)
+    start_in_thread(settings, args.port)
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="subtrans-bench-") as workdir:
+        # storage/ و checkpoints نسبت به cwd ساخته می‌شوند
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args, settings))
+        finally:
+            os.chdir(cwd)
+    save_results("e2e", [result], out)
+
+
+if __name__ == "__main__":
+    main()
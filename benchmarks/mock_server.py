@@ -0,0 +1,146 @@
+"""
+Local OpenAI-compatible chat completions server for load tests: "translates" every line it
+is sent, with configurable latency and injected 429s. Usage reports simulate OpenAI-style
+prefix caching (prefixes of 1024+ tokens, in 128-token steps) so cached input can be measured.
+
+    python -m benchmarks.mock_server --port 8765 --latency 0.5 --jitter 0.2 --rate-429 0.1
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from typing import Dict, List, Set
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class MockSettings:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                 retry_after: float = 1.0, stream_chunk_chars: int = 64, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.stream_chunk_chars = stream_chunk_chars
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.rate_limited = 0
+        self.lines = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.prefix_cache: Set[int] = set()
+
+
+# حدود ۴ کاراکتر در هر توکن: بلوک‌های ۱۲۸ توکنی، حداقل ۱۰۲۴ توکن
+CACHE_BLOCK_CHARS = 512
+CACHE_MIN_CHARS = 4096
+
+
+def _cached_chars(settings: MockSettings, prompt: str) -> int:
+    """Length of the longest block-aligned prefix already seen in an earlier request."""
+    cached = 0
+    for end in range(CACHE_BLOCK_CHARS, len(prompt) + 1, CACHE_BLOCK_CHARS):
+        key = hash(prompt[:end])
+        if cached == end - CACHE_BLOCK_CHARS and key in settings.prefix_cache:
+            cached = end
+        settings.prefix_cache.add(key)
+    return cached if cached >= CACHE_MIN_CHARS else 0
+
+
+def _payload_items(body: Dict) -> List[Dict]:
+    # آرایه JSON آخر پیام کاربر، همان DATA TO TRANSLATE است
+    user = body["messages"][-1]["content"]
+    start = user.rfind("[")
+    end = user.rfind("]")
+    if start == -1 or end < start:
+        return []
+    try:
+        return json.loads(user[start:end + 1])
+    except json.JSONDecodeError:
+        return []
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        settings.calls += 1
+
+        if settings.random.random() < settings.rate_429:
+            settings.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                status_code=429,
+                headers={"retry-after": str(settings.retry_after)}
+            )
+
+        await asyncio.sleep(max(0.0, settings.latency + settings.random.uniform(-settings.jitter, settings.jitter)))
+
+        items = [item for item in _payload_items(body) if "original" in item]
+        settings.lines += len(items)
+        content = json.dumps({"results": [
+            {"index": str(item["index"]), "translated": f"ترجمه {item['index']}"} for item in items
+        ]}, ensure_ascii=False)
+        prompt = "".join(message["content"] for message in body["messages"])
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 2,
+            "prompt_tokens_details": {"cached_tokens": _cached_chars(settings, prompt) // 4}
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        settings.prompt_tokens += usage["prompt_tokens"]
+        settings.cached_tokens += usage["prompt_tokens_details"]["cached_tokens"]
+
+        if not body.get("stream"):
+            return {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        def chunk(delta: Dict, finish_reason=None, **extra) -> str:
+            data = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def events():
+            step = settings.stream_chunk_chars
+            for i in range(0, len(content), step):
+                yield chunk({"content": content[i:i + step]})
+            yield chunk({}, "stop", usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def start_in_thread(settings: MockSettings, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_app(settings), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency, args.jitter, args.rate_429, args.retry_after)
+    uvicorn.run(create_app(settings), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
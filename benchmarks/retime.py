@@ -0,0 +1,139 @@
+"""
+timeline.retime() against a per-cue Python reference: an equivalence fuzz over random
+timelines (stacked, back-to-back, overlapping and unsorted cues) plus timing on a large file.
+
+    python -m benchmarks.retime --cues 50000 --repeat 5 --fuzz 3000
+"""
+import sys
+import math
+import random
+import argparse
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmarks.common import timed, save_results
+from app.utils.timeline import (
+    retime, MIN_DURATION_MS, MIN_GAP_MS, MAX_CPS, MAX_DURATION_MS,
+    OVERLAP_FIXED, OVERLAP_KEPT, GAP_ENFORCED, EXTENDED, TOO_SHORT, CPS_EXCEEDED
+)
+
+
+def reference_retime(
+        starts: List[int],
+        ends: List[int],
+        lengths: List[int],
+        min_duration: int,
+        min_gap: int,
+        max_cps: float,
+        max_duration: int
+) -> Tuple[List[int], List[int]]:
+    # یک cue در هر قدم، به ترتیب نمایش؛ مرجع خروجی برای نسخه NumPy
+    count = len(starts)
+    order = sorted(range(count), key=lambda i: starts[i])
+    new_ends = list(ends)
+    flags = [0] * count
+
+    for position, i in enumerate(order):
+        s, e, chars = starts[i], ends[i], lengths[i]
+        needed = math.ceil(chars * (1000.0 / max_cps))
+        desired = max(e, s + min(max(needed, min_duration), max_duration))
+
+        next_start = starts[order[position + 1]] if position + 1 < count else None
+        new_e = desired if next_start is None else min(desired, next_start - min_gap)
+        # هم‌زمان با cue بعدی: clamp کردن آن را حذف می‌کند، پس دست نمی‌خورد
+        stacked = new_e - s < min(e - s, min_duration)
+        if stacked:
+            new_e = e
+
+        if next_start is not None and e > next_start:
+            flags[i] |= OVERLAP_KEPT if stacked else OVERLAP_FIXED
+        elif next_start is not None and e > next_start - min_gap and not stacked:
+            flags[i] |= GAP_ENFORCED
+        if new_e > e:
+            flags[i] |= EXTENDED
+        duration = new_e - s
+        if duration < min_duration:
+            flags[i] |= TOO_SHORT
+        if chars * 1000 > max_cps * duration:
+            flags[i] |= CPS_EXCEEDED
+        new_ends[i] = new_e
+    return new_ends, flags
+
+
+def random_timeline(rng: random.Random) -> Tuple[List[int], List[int], List[int]]:
+    starts, ends, lengths = [], [], []
+    clock = rng.randint(0, 5000)
+    for _ in range(rng.randint(0, 40)):
+        # گاهی هم‌زمان با cue قبلی، گاهی درست پشت سرش
+        clock += rng.choice((0, 0, rng.randint(0, 120), rng.randint(0, 4000)))
+        duration = rng.choice((rng.randint(1, 400), rng.randint(400, 9000)))
+        starts.append(clock)
+        ends.append(clock + duration)
+        lengths.append(rng.randint(0, 160))
+    if rng.random() < 0.3:
+        shuffled = list(zip(starts, ends, lengths))
+        rng.shuffle(shuffled)
+        starts, ends, lengths = (list(column) for column in zip(*shuffled)) if shuffled else ([], [], [])
+    return starts, ends, lengths
+
+
+def verify(count: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(count):
+        starts, ends, lengths = random_timeline(rng)
+        params = (
+            rng.choice((MIN_DURATION_MS, rng.randint(0, 2000))),
+            rng.choice((MIN_GAP_MS, 0, rng.randint(0, 300))),
+            rng.choice((MAX_CPS, rng.uniform(5, 30))),
+            rng.choice((MAX_DURATION_MS, rng.randint(1000, 10000))),
+        )
+        expected = reference_retime(starts, ends, lengths, *params)
+        _, new_ends, flags = retime(np.array(starts), np.array(ends), np.array(lengths), *params)
+        if (new_ends.tolist(), flags.tolist()) != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"mismatch: {list(zip(starts, ends, lengths))} {params}", file=sys.stderr)
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cues", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=3000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    starts, ends, lengths = [], [], []
+    clock = 0
+    for _ in range(args.cues):
+        clock += rng.randint(0, 3000)
+        starts.append(clock)
+        ends.append(clock + rng.randint(300, 4000))
+        lengths.append(rng.randint(5, 90))
+    arrays = (np.array(starts), np.array(ends), np.array(lengths))
+    params = (MIN_DURATION_MS, MIN_GAP_MS, MAX_CPS, MAX_DURATION_MS)
+
+    reference = timed(lambda: reference_retime(starts, ends, lengths, *params), 1)
+    vectorized = timed(lambda: retime(*arrays, *params), args.repeat)
+
+    mismatches = verify(args.fuzz) if args.fuzz else None
+    save_results("retime", [{
+        "name": f"retime/{args.cues}",
+        "params": {"cues": args.cues, "fuzz_cases": args.fuzz},
+        "metrics": {
+            "reference_ms": round(reference * 1000, 2),
+            "retime_ms": round(vectorized * 1000, 2),
+            "speedup": round(reference / vectorized, 2),
+            "fuzz_mismatches": mismatches,
+        },
+    }], args.out)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
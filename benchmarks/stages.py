@@ -0,0 +1,73 @@
+"""
+Per-stage micro-benchmarks of the preprocessing pipeline and the SRT writer.
+
+    python -m benchmarks.stages --sizes 1000,10000,50000 --encodings utf-8,utf-8-sig,cp1256,utf-16
+"""
+import argparse
+import logging
+from typing import List, Dict
+
+from benchmarks.common import timed, save_results
+from benchmarks.synthetic import make_srt
+from app.utils.decoder import decode_subtitle_bytes
+from app.utils.parser import parse_srt_content
+from app.utils.timeline import normalize_subtitle_timeline, retime, cue_arrays
+from app.utils.cleaner import prepare_for_translation
+from app.utils.preprocess import preprocess_subtitle
+from app.utils.writer import render_srt
+
+
+def bench_case(cues: int, encoding: str, noise: float, language: str, repeat: int) -> Dict:
+    content = make_srt(cues, noise, encoding=encoding, language=language)
+    text = decode_subtitle_bytes(content)
+    parsed = parse_srt_content(text)
+    normalized = normalize_subtitle_timeline(parsed)
+    cleaned = prepare_for_translation(normalized)
+    # هر cue یک ترجمه دارد تا writer مسیر کامل را طی کند
+    trans_map = {str(cue.index): cue.clean for cue in cleaned}
+    starts, ends = cue_arrays(cleaned)
+    lengths = [len(cue.clean) for cue in cleaned]
+
+    metrics = {
+        "decode_ms": timed(lambda: decode_subtitle_bytes(content), repeat),
+        "parse_ms": timed(lambda: parse_srt_content(text), repeat),
+        "timeline_ms": timed(lambda: normalize_subtitle_timeline(parsed), repeat),
+        "clean_ms": timed(lambda: prepare_for_translation(normalized), repeat),
+        "retime_ms": timed(lambda: retime(starts, ends, lengths), repeat),
+        "render_ms": timed(lambda: render_srt(cleaned, trans_map), repeat),
+        "preprocess_ms": timed(lambda: preprocess_subtitle(content), repeat),
+    }
+    metrics = {name: round(seconds * 1000, 3) for name, seconds in metrics.items()}
+    metrics["preprocess_cues_per_s"] = round(len(cleaned) / (metrics["preprocess_ms"] / 1000))
+
+    return {
+        "name": f"stages/{language}/{encoding}/noise{noise}/{cues}",
+        "params": {"cues": cues, "encoding": encoding, "noise_ratio": noise, "language": language, "bytes": len(content)},
+        "metrics": metrics,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--encodings", default="utf-8,utf-8-sig,cp1256,utf-16")
+    parser.add_argument("--noise", default="0.1,0.4")
+    parser.add_argument("--languages", default="en,fa")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    # هشدارهای overlap/skip زمان‌سنجی را خراب می‌کنند
+    logging.disable(logging.WARNING)
+
+    results: List[Dict] = []
+    for language in args.languages.split(","):
+        for encoding in args.encodings.split(","):
+            for noise in map(float, args.noise.split(",")):
+                for cues in map(int, args.sizes.split(",")):
+                    results.append(bench_case(cues, encoding, noise, language, args.repeat))
+    save_results("stages", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Cold start: time to import `app.main` and to finish the lifespan startup (ready to serve).
+
+    python -m benchmarks.startup --runs 5 --top 15
+
+Every run is a fresh interpreter in a temp directory. One extra run under `-X importtime`
+lists the slowest imports (cumulative), and the result records which provider SDKs were
+already loaded when `app.main` finished importing (they should load lazily).
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, List, Tuple
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ماژول‌هایی که نباید در زمان import برنامه load شوند
+LAZY_MODULES = ("openai", "groq", "google.genai", "dotenv")
+# بعد از این خط importtime مربوط به lifespan است (مثلاً preload SDK در پس‌زمینه)
+IMPORTED_MARKER = "--- app.main imported"
+
+PROBE = """
+import sys, time, json, asyncio
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+sys.stderr.write({marker!r} + chr(10))
+loaded = [m for m in {lazy!r} if m in sys.modules]
+
+async def ready():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter()
+
+ready_at = asyncio.run(ready())
+print(json.dumps({{"import_ms": (imported - started) * 1000, "ready_ms": (ready_at - started) * 1000, "loaded": loaded}}))
+"""
+
+
+def probe_env(provider: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    # یک provider ساختگی از نوع انتخاب‌شده؛ هیچ درخواستی ارسال نمی‌شود
+    env.update({
+        "LLM_PROVIDERS": "bench",
+        "BENCH_KIND": provider,
+        "BENCH_BASE_URL": "http://127.0.0.1:9/v1",
+        "BENCH_API_KEY": "bench",
+        "BENCH_MODEL": "bench-model",
+    })
+    return env
+
+
+def run_probe(env: Dict[str, str], importtime: bool = False) -> Tuple[Dict, str]:
+    with tempfile.TemporaryDirectory(prefix="subtrans-startup-") as workdir:
+        command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c",
+                   PROBE.format(lazy=LAZY_MODULES, marker=IMPORTED_MARKER)]
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_imports(stderr: str, top: int) -> List[Dict]:
+    """Parses the `-X importtime` lines of the `app.main` import into its `top` slowest modules."""
+    rows = []
+    for line in stderr.split(IMPORTED_MARKER)[0].splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indented module>"
+        self_part, cumulative_us, module = line.split("|", 2)
+        try:
+            rows.append({"module": module.strip(), "cumulative_ms": int(cumulative_us) / 1000,
+                         "self_ms": int(self_part.split(":")[-1]) / 1000})
+        except ValueError:
+            continue
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--provider", default="openai", help="provider kind to configure (openai, groq, gemini)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    env = probe_env(args.provider)
+    # اجرای اول فقط cache بایت‌کد و دیسک را گرم می‌کند
+    run_probe(env)
+    samples = [run_probe(env)[0] for _ in range(args.runs)]
+    traced, stderr = run_probe(env, importtime=True)
+    imports = slowest_imports(stderr, args.top)
+
+    for row in imports:
+        print(f"{row['cumulative_ms']:9.1f} ms  {row['self_ms']:8.1f} ms self  {row['module']}")
+
+    import_ms = [sample["import_ms"] for sample in samples]
+    ready_ms = [sample["ready_ms"] for sample in samples]
+    result = {
+        "name": f"startup/{args.provider}",
+        "params": {"runs": args.runs, "provider": args.provider},
+        "metrics": {
+            "import_ms": round(statistics.median(import_ms), 1),
+            "import_max_ms": round(max(import_ms), 1),
+            "ready_ms": round(statistics.median(ready_ms), 1),
+            "lazy_modules_loaded": len(samples[0]["loaded"]),
+        },
+        "loaded_at_import": samples[0]["loaded"],
+        "slowest_imports": imports,
+    }
+    save_results("startup", [result], args.out)
+
+
+if __name__ == "__main__":
+    main()
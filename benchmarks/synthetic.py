@@ -0,0 +1,89 @@
+import re
+import random
+from typing import List
+
+LINES = {
+    "en": [
+        "I'm not going anywhere.", "You're gonna regret this.", "Where were you last night?",
+        "Don't tell me what to do!", "It's fine. Really.", "We need to talk.",
+        "I wanna go home.", "Get down!", "<i>Previously on the show...</i>", "What the hell is that?",
+    ],
+    "fa": [
+        "من جایی نمی‌رم.", "پشیمون می‌شی.", "دیشب کجا بودی؟", "به من نگو چیکار کنم!",
+        "خوبه. واقعاً.", "باید حرف بزنیم.", "می‌خوام برم خونه.", "بخواب!",
+    ],
+}
+# جمله‌هایی که در چند cue پشت سر هم شکسته شده‌اند
+SPLIT_SENTENCES = [
+    ["I was going to tell you", "but you never listened."],
+    ["If we leave right now,", "we can still make it", "before the sun goes down."],
+    ["You know what your problem is?", "You think everyone owes you something."],
+    ["The last time I saw him", "he was standing by the river..."],
+    ["Whatever happens tonight,", "promise me you won't come back here."],
+]
+# شماره یکتا قبل از علامت پایان جمله می‌نشیند تا مرز جمله عوض نشود
+TRAILING_PUNCTUATION = re.compile(r"((?:<[^>]+>|[.!?…\"'”)\]♪])*)$")
+NOISE = ["[Music]", "♪ la la la ♪", "(LAUGHING)", "[door slams]", "JOHN: Hey!", "- Yeah.", "I-I don't know."]
+
+# SRT ساعت دو رقمی دارد؛ فایل‌های خیلی بزرگ فشرده‌تر زمان‌بندی می‌شوند
+MAX_TIMELINE_MS = 90 * 3600 * 1000
+AVERAGE_CUE_MS = 3700
+
+
+def _ts(ms: int) -> str:
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def make_srt_text(
+        cues: int,
+        noise_ratio: float = 0.1,
+        seed: int = 0,
+        language: str = "en",
+        unique: bool = False,
+        line_ending: str = "\n",
+        split_ratio: float = 0.0
+) -> str:
+    """
+    Synthetic SRT with realistic timings and scene gaps. `noise_ratio` of the cues are
+    [Music]/speaker-label/stutter lines; `split_ratio` of the cues start an English sentence
+    continued over the next 1-2 cues; `unique` numbers every line so nothing deduplicates.
+    """
+    rng = random.Random(seed)
+    lines = LINES[language]
+    parts: List[str] = []
+    t = 1000
+    scale = min(1.0, MAX_TIMELINE_MS / (cues * AVERAGE_CUE_MS)) if cues else 1.0
+    continued: List[str] = []
+    for i in range(1, cues + 1):
+        duration = int(rng.randint(800, 4000) * scale) + 1
+        if continued:
+            text = continued.pop(0)
+        elif split_ratio and rng.random() < split_ratio:
+            text, *continued = rng.choice(SPLIT_SENTENCES)
+        elif rng.random() < noise_ratio:
+            text = rng.choice(NOISE)
+        else:
+            text = "\n".join(rng.choice(lines) for _ in range(rng.choice((1, 1, 2))))
+        if unique:
+            text = TRAILING_PUNCTUATION.sub(lambda m: f" {i}{m.group(1)}", text, count=1)
+        parts.append(f"{i}\n{_ts(t)} --> {_ts(t + duration)}\n{text}\n\n")
+        # ادامه جمله بلافاصله بعد می‌آید
+        gap = 100 if continued else rng.choice((100, 300, 800, 4000))
+        t += duration + int(gap * scale)
+
+    text = "".join(parts)
+    return text.replace("\n", line_ending) if line_ending != "\n" else text
+
+
+def make_srt(
+        cues: int,
+        noise_ratio: float = 0.1,
+        encoding: str = "utf-8",
+        seed: int = 0,
+        language: str = "en",
+        unique: bool = False,
+        line_ending: str = "\n",
+        split_ratio: float = 0.0
+) -> bytes:
+    # کاراکترهایی که در encodingهای قدیمی نیستند (مثل ♪ در cp1256) با ? جایگزین می‌شوند
+    return make_srt_text(cues, noise_ratio, seed, language, unique, line_ending, split_ratio).encode(encoding, errors="replace")
@@ -0,0 +1,100 @@
+import pytest
+
+from app.services.retry import CircuitBreaker, CircuitOpenError, RATE_LIMIT, SERVER, CLIENT
+
+
+def make_breaker() -> CircuitBreaker:
+    return CircuitBreaker(failure_threshold=3, cooldown_seconds=30.0)
+
+
+def test_rate_limits_do_not_open_the_circuit():
+    breaker = make_breaker()
+    for _ in range(20):
+        breaker.before_call()
+        breaker.record_failure(RATE_LIMIT, retry_after=1.0)
+
+    assert breaker.state == "closed"
+    assert not breaker.is_open()
+    breaker.before_call()
+
+
+def test_client_errors_do_not_open_the_circuit():
+    breaker = make_breaker()
+    for _ in range(5):
+        breaker.record_failure(CLIENT)
+    assert breaker.state == "closed"
+
+
+def test_server_failures_open_the_circuit_at_the_threshold():
+    breaker = make_breaker()
+    breaker.record_failure(SERVER)
+    breaker.record_failure(SERVER)
+    assert breaker.state == "closed"
+
+    breaker.record_failure(SERVER)
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count():
+    breaker = make_breaker()
+    breaker.record_failure(SERVER)
+    breaker.record_failure(SERVER)
+    breaker.record_success()
+    breaker.record_failure(SERVER)
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_one_probe():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(SERVER)
+    breaker.opened_until = 0.0
+
+    assert breaker.before_call() is True
+    assert breaker.state == "half_open"
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(SERVER)
+    breaker.opened_until = 0.0
+
+    breaker.before_call()
+    breaker.record_failure(SERVER)
+    assert breaker.state == "open"
+    assert breaker.is_open()
+
+
+def test_rate_limited_probe_keeps_half_open_and_frees_the_probe():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(SERVER)
+    breaker.opened_until = 0.0
+
+    breaker.before_call()
+    breaker.record_failure(RATE_LIMIT, retry_after=1.0)
+    assert breaker.state == "half_open"
+    assert not breaker.is_open()
+    assert breaker.before_call() is True
+
+
+def test_released_probe_can_be_retried():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(SERVER)
+    breaker.opened_until = 0.0
+
+    breaker.before_call()
+    breaker.release_probe()
+    assert not breaker.is_open()
+    assert breaker.before_call() is True